@@ -0,0 +1,317 @@
+# coding: utf-8
+################################################################################
+# The MIT License (MIT)
+#
+# Copyright (c) 2014 Francisco Ruiz
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+################################################################################
+
+"""
+Board of the latest PCM values in memory shared by local processes.
+
+A single :class:`BoardPublisher` owns the interface to the vehicle and writes
+the latest value of each definition into a memory-mapped file (preferably
+under "/dev/shm"); any number of :class:`BoardReader` instances read them
+without locks nor system calls.
+
+The file starts with a header (magic string, slot count) followed by one
+fixed-size slot per definition. Each slot holds a sequence number, the
+request of the definition, the unit code, flags, the value and the timestamp.
+Slots are updated seqlock-style: the sequence number is odd while a slot is
+being written, and readers retry until they see the same even sequence
+number before and after reading the slot, for up to a second.
+
+"""
+
+from logging import getLogger
+from numbers import Real
+from struct import Struct
+import mmap
+import os
+import time
+
+from elm327.connection import ConnectionError
+from elm327.obd import ELMError
+from elm327.obd import ValueNotAvailableError
+from elm327.pcm_values import NumericValueParser
+from elm327.pcm_values import PCMValue
+
+
+DEFAULT_BOARD_FILE_PATH = "/dev/shm/elm327-board"
+
+_BOARD_MAGIC = b"ELMB\x01"
+
+_HEADER = Struct("<5s3xI")
+
+_SLOT = Struct("<I4sHH4xdd")
+
+_SEQUENCE_NUMBER = Struct("<I")
+
+_SLOT_PAYLOAD_OFFSET = _SEQUENCE_NUMBER.size
+
+_SLOT_PAYLOAD = Struct("<4sHH4xdd")
+
+_SEQUENCE_NUMBER_MODULO = 2 ** 32
+
+_HAS_VALUE_FLAG = 0x1
+
+_MAX_COMMAND_KEY_SIZE = 4
+
+_MAX_READ_RETRY_DURATION = 1
+
+_UNITS = (
+    None,
+    "%",
+    "L/h",
+    "km/h",
+    "rpm",
+    "°C",
+    "kPa",
+    "V",
+    "s",
+    "km",
+    "g/s",
+    "°",
+    )
+
+_UNIT_CODES_BY_UNIT = {unit: code for code, unit in enumerate(_UNITS)}
+
+
+class BoardError(Exception):
+    pass
+
+
+class BoardPublisher(object):
+    """
+    Publisher of the latest values read from an interface to a board.
+
+    Only numeric values (those parsed by a
+    :class:`~elm327.pcm_values.NumericValueParser`) in known units can be
+    published. When a value can't be read, its previous value is kept on the
+    board, and its timestamp tells how old it is.
+
+    """
+
+    _LOGGER = getLogger(__name__ + "BoardPublisher")
+
+    def __init__(
+        self,
+        interface,
+        pcm_value_definitions,
+        file_path=DEFAULT_BOARD_FILE_PATH,
+        ):
+        for definition in pcm_value_definitions:
+            _check_definition_is_publishable(definition)
+
+        self._interface = interface
+        self._pcm_value_definitions = pcm_value_definitions
+
+        self._slot_offsets_by_definition = {}
+        self._sequence_numbers_by_definition = {}
+
+        file_size = _HEADER.size + _SLOT.size * len(pcm_value_definitions)
+        file_descriptor = os.open(file_path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            os.ftruncate(file_descriptor, file_size)
+            self._memory = mmap.mmap(file_descriptor, file_size)
+        finally:
+            os.close(file_descriptor)
+
+        self._initialize_board()
+
+    def publish_once(self, now=None):
+        """Read all the values and publish them; return the values read"""
+        pcm_values = {}
+        for definition in self._pcm_value_definitions:
+            try:
+                pcm_value = self._interface.read_pcm_value(definition)
+            except ValueNotAvailableError:
+                self._LOGGER.debug("Value %r is not available", definition)
+                continue
+            except (ELMError, ConnectionError) as exc:
+                self._LOGGER.warning(
+                    "Failed to read value %r: %s",
+                    definition,
+                    exc,
+                    )
+                continue
+
+            if pcm_value is None:
+                self._LOGGER.debug("No data for value %r", definition)
+                continue
+
+            timestamp = time.time() if now is None else now
+            self.publish(definition, pcm_value, timestamp)
+            pcm_values[definition] = pcm_value
+        return pcm_values
+
+    def publish(self, pcm_value_definition, pcm_value, timestamp):
+        """Write the latest value of a definition to its slot"""
+        if not isinstance(pcm_value.value, Real):
+            raise BoardError(
+                "Only numeric values can be published; got {!r}".format(
+                    pcm_value.value,
+                    ),
+                )
+        try:
+            unit_code = _UNIT_CODES_BY_UNIT[pcm_value.unit]
+        except KeyError:
+            raise BoardError("Unknown unit {!r}".format(pcm_value.unit))
+
+        slot_offset = self._slot_offsets_by_definition[pcm_value_definition]
+        sequence_number = \
+            self._sequence_numbers_by_definition[pcm_value_definition]
+
+        _SEQUENCE_NUMBER.pack_into(
+            self._memory,
+            slot_offset,
+            (sequence_number + 1) % _SEQUENCE_NUMBER_MODULO,
+            )
+        _SLOT_PAYLOAD.pack_into(
+            self._memory,
+            slot_offset + _SLOT_PAYLOAD_OFFSET,
+            _get_command_key(pcm_value_definition.command),
+            unit_code,
+            _HAS_VALUE_FLAG,
+            pcm_value.value,
+            timestamp,
+            )
+        sequence_number = (sequence_number + 2) % _SEQUENCE_NUMBER_MODULO
+        _SEQUENCE_NUMBER.pack_into(self._memory, slot_offset, sequence_number)
+
+        self._sequence_numbers_by_definition[pcm_value_definition] = \
+            sequence_number
+
+    def close(self):
+        self._memory.close()
+
+    def _initialize_board(self):
+        _HEADER.pack_into(
+            self._memory,
+            0,
+            _BOARD_MAGIC,
+            len(self._pcm_value_definitions),
+            )
+        for slot_index, definition in enumerate(self._pcm_value_definitions):
+            slot_offset = _HEADER.size + _SLOT.size * slot_index
+            _SLOT.pack_into(
+                self._memory,
+                slot_offset,
+                0,
+                _get_command_key(definition.command),
+                0,
+                0,
+                0,
+                0,
+                )
+            self._slot_offsets_by_definition[definition] = slot_offset
+            self._sequence_numbers_by_definition[definition] = 0
+
+
+class BoardReader(object):
+    """Lock-free reader of the values on a board"""
+
+    def __init__(self, file_path=DEFAULT_BOARD_FILE_PATH):
+        with open(file_path, "rb") as board_file:
+            self._memory = mmap.mmap(
+                board_file.fileno(),
+                0,
+                access=mmap.ACCESS_READ,
+                )
+
+        magic, slot_count = _HEADER.unpack_from(self._memory, 0)
+        if magic != _BOARD_MAGIC:
+            self._memory.close()
+            raise BoardError("{!r} is not a board".format(file_path))
+
+        self._slot_offsets_by_command_key = {}
+        for slot_index in range(slot_count):
+            slot_offset = _HEADER.size + _SLOT.size * slot_index
+            command_key = _SLOT.unpack_from(self._memory, slot_offset)[1]
+            self._slot_offsets_by_command_key[command_key] = slot_offset
+
+    def read(self, pcm_value_definition):
+        """
+        Return the latest value of "pcm_value_definition" and its timestamp.
+
+        :return: The tuple (PCM value, timestamp), or None if the value has
+            not been published yet
+        :raises KeyError: If the value is not on the board
+        :raises BoardError: If the slot of the value is still being written
+            after retrying for a second, for example because the publisher
+            died while writing it
+
+        """
+        command_key = _get_command_key(pcm_value_definition.command)
+        slot_offset = self._slot_offsets_by_command_key[command_key]
+
+        give_up_time = None
+        while True:
+            sequence_number, = \
+                _SEQUENCE_NUMBER.unpack_from(self._memory, slot_offset)
+            if not sequence_number % 2:
+                slot_payload = _SLOT_PAYLOAD.unpack_from(
+                    self._memory,
+                    slot_offset + _SLOT_PAYLOAD_OFFSET,
+                    )
+
+                final_sequence_number, = \
+                    _SEQUENCE_NUMBER.unpack_from(self._memory, slot_offset)
+                if final_sequence_number == sequence_number:
+                    break
+
+            # The clock is only checked when retrying, so that uncontended
+            # reads remain free of system calls
+            if give_up_time is None:
+                give_up_time = time.time() + _MAX_READ_RETRY_DURATION
+            elif give_up_time <= time.time():
+                raise BoardError(
+                    "The slot of {!r} is being written for too long".format(
+                        pcm_value_definition.command,
+                        ),
+                    )
+
+        _, unit_code, flags, value, timestamp = slot_payload
+        if not flags & _HAS_VALUE_FLAG:
+            return None
+
+        return PCMValue(value, _UNITS[unit_code]), timestamp
+
+    def close(self):
+        self._memory.close()
+
+
+def _check_definition_is_publishable(pcm_value_definition):
+    parser = pcm_value_definition.parser
+    if not isinstance(parser, NumericValueParser):
+        raise BoardError(
+            "Only numeric values can be published; {!r} isn't".format(
+                pcm_value_definition.command,
+                ),
+            )
+    if parser.unit not in _UNIT_CODES_BY_UNIT:
+        raise BoardError("Unknown unit {!r}".format(parser.unit))
+
+
+def _get_command_key(command):
+    command_bytes = bytearray(int(w, 16) for w in command.to_hex_words())
+    if _MAX_COMMAND_KEY_SIZE < len(command_bytes):
+        raise BoardError("Command {!r} is too long".format(command))
+    return bytes(command_bytes.ljust(_MAX_COMMAND_KEY_SIZE, b"\x00"))
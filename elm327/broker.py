@@ -0,0 +1,192 @@
+################################################################################
+# The MIT License (MIT)
+#
+# Copyright (c) 2014 Francisco Ruiz
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+################################################################################
+
+from collections import deque
+from logging import getLogger
+from threading import Condition
+from threading import Event
+from threading import Thread
+import time
+
+from elm327.connection import ConnectionError
+from elm327.connection import RequestTimeoutError
+
+
+class CommandFuture(object):
+    """Response to a command that will be available once it's been sent"""
+
+    def __init__(self):
+        self._event = Event()
+        self._response = None
+        self._exception = None
+
+    def done(self):
+        return self._event.is_set()
+
+    def result(self, timeout=None):
+        if not self._event.wait(timeout):
+            raise RequestTimeoutError("Timed out waiting for the response")
+
+        if self._exception is not None:
+            raise self._exception
+        return self._response
+
+    def set_result(self, response):
+        self._response = response
+        self._event.set()
+
+    def set_exception(self, exception):
+        self._exception = exception
+        self._event.set()
+
+
+class ConnectionBroker(object):
+    """
+    Share a single connection between several threads.
+
+    The connection is owned by a dedicated I/O thread which sends the commands
+    in the order they were submitted. Identical commands that are still
+    waiting to be sent are merged, so that all their callers get the same
+    response.
+
+    A broker exposes the same interface as the connection it wraps and
+    therefore an :class:`~elm327.obd.OBDInterface` built on it can be shared
+    by all the threads.
+
+    When merged requests have different deadlines, the command is sent with
+    the latest one, but each caller waits until its own deadline. Requests
+    whose deadline expires while they are queued are never sent.
+
+    """
+
+    _LOGGER = getLogger(__name__ + "ConnectionBroker")
+
+    def __init__(self, connection):
+        self._connection = connection
+
+        self._condition = Condition()
+        self._pending_requests = deque()
+        self._futures_by_request = {}
+        self._deadlines_by_request = {}
+        self._is_closed = False
+
+        self._io_thread = Thread(
+            target=self._process_requests,
+            name="ELM327 connection broker",
+            )
+        self._io_thread.daemon = True
+        self._io_thread.start()
+
+    def submit(self, data, read_delay=None, deadline=None):
+        """Queue "data" to be sent and return a future for its response"""
+        request = (data, read_delay)
+        with self._condition:
+            if self._is_closed:
+                raise ConnectionError("The connection broker is closed")
+
+            future = self._futures_by_request.get(request)
+            if future is None:
+                future = CommandFuture()
+                self._futures_by_request[request] = future
+                self._deadlines_by_request[request] = deadline
+                self._pending_requests.append(request)
+                self._condition.notify()
+            else:
+                self._LOGGER.debug("Merged pending request %r", data)
+                self._deadlines_by_request[request] = _get_latest_deadline(
+                    self._deadlines_by_request[request],
+                    deadline,
+                    )
+
+        return future
+
+    def send_command(self, data, read_delay=None, deadline=None):
+        future = self.submit(data, read_delay, deadline)
+
+        if deadline is None:
+            timeout = None
+        else:
+            timeout = max(deadline - time.time(), 0)
+        return future.result(timeout)
+
+    def close(self):
+        with self._condition:
+            if self._is_closed:
+                return
+            self._is_closed = True
+            self._condition.notify()
+
+        self._io_thread.join()
+        self._connection.close()
+
+    def _process_requests(self):
+        while True:
+            with self._condition:
+                while not self._pending_requests and not self._is_closed:
+                    self._condition.wait()
+
+                if self._is_closed:
+                    self._cancel_pending_requests()
+                    return
+
+                request = self._pending_requests.popleft()
+                future = self._futures_by_request.pop(request)
+                deadline = self._deadlines_by_request.pop(request)
+
+            if deadline is not None and deadline <= time.time():
+                self._LOGGER.debug("Request %r expired in the queue", request)
+                future.set_exception(
+                    RequestTimeoutError("The deadline of the command expired"),
+                    )
+                continue
+
+            data, read_delay = request
+            try:
+                if deadline is None:
+                    response = self._connection.send_command(data, read_delay)
+                else:
+                    response = self._connection.send_command(
+                        data,
+                        read_delay,
+                        deadline,
+                        )
+            except Exception as exc:
+                future.set_exception(exc)
+            else:
+                future.set_result(response)
+
+    def _cancel_pending_requests(self):
+        for future in self._futures_by_request.values():
+            future.set_exception(
+                ConnectionError("The connection broker was closed"),
+                )
+        self._futures_by_request.clear()
+        self._deadlines_by_request.clear()
+        self._pending_requests.clear()
+
+
+def _get_latest_deadline(deadline1, deadline2):
+    if deadline1 is None or deadline2 is None:
+        return None
+    return max(deadline1, deadline2)
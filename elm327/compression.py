@@ -0,0 +1,356 @@
+################################################################################
+# The MIT License (MIT)
+#
+# Copyright (c) 2014 Francisco Ruiz
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+################################################################################
+
+from struct import Struct
+
+
+_BLOCK_HEADER = Struct(">HII")
+
+_FLOAT = Struct(">d")
+
+_UINT64 = Struct(">Q")
+
+_MILLISECONDS_PER_SECOND = 1000
+
+# Prefix and size in bits of each range of timestamp delta-of-deltas, after
+# the one-bit prefix for zero
+_DELTA_OF_DELTA_ENCODINGS = (
+    (0b10, 2, 7),
+    (0b110, 3, 9),
+    (0b1110, 4, 12),
+    (0b1111, 4, 64),
+    )
+
+_LEADING_ZEROS_BIT_COUNT = 5
+
+_MEANINGFUL_BITS_BIT_COUNT = 6
+
+_MAX_LEADING_ZEROS = (1 << _LEADING_ZEROS_BIT_COUNT) - 1
+
+
+class ChangeFilter(object):
+    """Filter that lets a sample through only if its value changed"""
+
+    def __init__(self):
+        self._last_value = None
+
+    def __call__(self, value):
+        if value == self._last_value:
+            return False
+
+        self._last_value = value
+        return True
+
+
+class DeadbandFilter(object):
+    """
+    Filter that lets a sample through only if its value differs by more than
+    "threshold" from the last one let through.
+
+    """
+
+    def __init__(self, threshold):
+        self._threshold = threshold
+        self._last_value = None
+
+    def __call__(self, value):
+        if self._last_value is not None and \
+                abs(value - self._last_value) <= self._threshold:
+            return False
+
+        self._last_value = value
+        return True
+
+
+class UploadStage(object):
+    """
+    Filter and compress the samples of several channels for uploading.
+
+    "channels" is a sequence of (definition, filter) pairs, where the filter
+    may be None to keep every sample. The position of each definition is the
+    id of its channel in the encoded blocks. Only numeric values are
+    supported.
+
+    """
+
+    def __init__(self, channels):
+        self._channel_ids_by_definition = {}
+        self._filters_by_definition = {}
+        for channel_id, (definition, sample_filter) in enumerate(channels):
+            self._channel_ids_by_definition[definition] = channel_id
+            self._filters_by_definition[definition] = sample_filter
+
+        self._encoders_by_definition = {}
+
+    def add(self, definition, pcm_value, timestamp):
+        """Add a sample, returning whether it was kept by the filter"""
+        if pcm_value is None:
+            return False
+
+        sample_filter = self._filters_by_definition[definition]
+        if sample_filter is not None and not sample_filter(pcm_value.value):
+            return False
+
+        encoder = self._encoders_by_definition.get(definition)
+        if encoder is None:
+            channel_id = self._channel_ids_by_definition[definition]
+            encoder = SampleBlockEncoder(channel_id)
+            self._encoders_by_definition[definition] = encoder
+
+        timestamp_ms = int(round(timestamp * _MILLISECONDS_PER_SECOND))
+        encoder.append(timestamp_ms, pcm_value.value)
+        return True
+
+    def flush(self):
+        """Return the blocks of the samples kept since the last flush"""
+        blocks = [
+            encoder.finish()
+            for encoder in self._encoders_by_definition.values()
+            ]
+        self._encoders_by_definition.clear()
+        return b"".join(blocks)
+
+
+class SampleBlockEncoder(object):
+    """
+    Encoder of the samples of a channel into a compressed block.
+
+    Timestamps (integer milliseconds) are encoded as delta-of-deltas and
+    values as the XOR with the previous one, like in Facebook's Gorilla.
+    Regularly polled, slowly changing channels need a few bits per sample.
+
+    """
+
+    def __init__(self, channel_id):
+        self._channel_id = channel_id
+
+        self._bit_writer = _BitWriter()
+        self.sample_count = 0
+
+        self._previous_timestamp = None
+        self._previous_delta = 0
+        self._previous_value_bits = None
+        self._previous_leading_zeros = None
+        self._previous_trailing_zeros = None
+
+    def append(self, timestamp, value):
+        value_bits = _UINT64.unpack(_FLOAT.pack(value))[0]
+
+        if self.sample_count:
+            self._append_timestamp(timestamp)
+            self._append_value(value_bits)
+        else:
+            self._bit_writer.write(timestamp, 64)
+            self._bit_writer.write(value_bits, 64)
+
+        self._previous_timestamp = timestamp
+        self._previous_value_bits = value_bits
+        self.sample_count += 1
+
+    def finish(self):
+        payload = self._bit_writer.getvalue()
+        header = _BLOCK_HEADER.pack(
+            self._channel_id,
+            self.sample_count,
+            len(payload),
+            )
+        return header + payload
+
+    def _append_timestamp(self, timestamp):
+        delta = timestamp - self._previous_timestamp
+        delta_of_delta = delta - self._previous_delta
+        self._previous_delta = delta
+
+        if delta_of_delta == 0:
+            self._bit_writer.write(0, 1)
+            return
+
+        for prefix, prefix_size, value_size in _DELTA_OF_DELTA_ENCODINGS:
+            limit = 1 << (value_size - 1)
+            if -limit <= delta_of_delta < limit:
+                self._bit_writer.write(prefix, prefix_size)
+                self._bit_writer.write(delta_of_delta, value_size)
+                return
+
+    def _append_value(self, value_bits):
+        xor = value_bits ^ self._previous_value_bits
+        if xor == 0:
+            self._bit_writer.write(0, 1)
+            return
+
+        leading_zeros = min(64 - xor.bit_length(), _MAX_LEADING_ZEROS)
+        trailing_zeros = (xor & -xor).bit_length() - 1
+
+        if self._previous_leading_zeros is not None and \
+                self._previous_leading_zeros <= leading_zeros and \
+                self._previous_trailing_zeros <= trailing_zeros:
+            # The meaningful bits fit in the previous window
+            meaningful_bit_count = 64 - \
+                self._previous_leading_zeros - self._previous_trailing_zeros
+            self._bit_writer.write(0b10, 2)
+            self._bit_writer.write(
+                xor >> self._previous_trailing_zeros,
+                meaningful_bit_count,
+                )
+        else:
+            meaningful_bit_count = 64 - leading_zeros - trailing_zeros
+            self._bit_writer.write(0b11, 2)
+            self._bit_writer.write(leading_zeros, _LEADING_ZEROS_BIT_COUNT)
+            self._bit_writer.write(
+                meaningful_bit_count - 1,
+                _MEANINGFUL_BITS_BIT_COUNT,
+                )
+            self._bit_writer.write(xor >> trailing_zeros, meaningful_bit_count)
+
+            self._previous_leading_zeros = leading_zeros
+            self._previous_trailing_zeros = trailing_zeros
+
+
+class SampleBlockDecoder(object):
+    """
+    Streaming decoder of the blocks produced by :class:`SampleBlockEncoder`.
+
+    The data can be fed in chunks of any size.
+
+    """
+
+    def __init__(self):
+        self._pending_data = b""
+
+    def feed(self, data):
+        """Return the channel id and samples of each block completed"""
+        self._pending_data += data
+
+        blocks = []
+        while _BLOCK_HEADER.size <= len(self._pending_data):
+            channel_id, sample_count, payload_size = \
+                _BLOCK_HEADER.unpack_from(self._pending_data)
+            block_size = _BLOCK_HEADER.size + payload_size
+            if len(self._pending_data) < block_size:
+                break
+
+            payload = self._pending_data[_BLOCK_HEADER.size:block_size]
+            self._pending_data = self._pending_data[block_size:]
+
+            samples = _decode_samples(payload, sample_count)
+            blocks.append((channel_id, samples))
+
+        return blocks
+
+
+def _decode_samples(payload, sample_count):
+    bit_reader = _BitReader(payload)
+    samples = []
+
+    timestamp = None
+    delta = 0
+    value_bits = None
+    leading_zeros = None
+    meaningful_bit_count = None
+    for sample_index in range(sample_count):
+        if sample_index == 0:
+            timestamp = bit_reader.read(64)
+            value_bits = bit_reader.read(64)
+        else:
+            delta += _read_delta_of_delta(bit_reader)
+            timestamp += delta
+
+            if bit_reader.read(1):
+                if bit_reader.read(1):
+                    leading_zeros = bit_reader.read(_LEADING_ZEROS_BIT_COUNT)
+                    meaningful_bit_count = \
+                        bit_reader.read(_MEANINGFUL_BITS_BIT_COUNT) + 1
+                trailing_zeros = 64 - leading_zeros - meaningful_bit_count
+                xor = bit_reader.read(meaningful_bit_count) << trailing_zeros
+                value_bits ^= xor
+
+        value = _FLOAT.unpack(_UINT64.pack(value_bits))[0]
+        samples.append((timestamp, value))
+
+    return samples
+
+
+def _read_delta_of_delta(bit_reader):
+    prefix_ones_count = 0
+    while prefix_ones_count < len(_DELTA_OF_DELTA_ENCODINGS) and \
+            bit_reader.read(1):
+        prefix_ones_count += 1
+
+    if not prefix_ones_count:
+        return 0
+
+    value_size = _DELTA_OF_DELTA_ENCODINGS[prefix_ones_count - 1][2]
+    value = bit_reader.read(value_size)
+    if value >> (value_size - 1):
+        value -= 1 << value_size
+    return value
+
+
+class _BitWriter(object):
+
+    def __init__(self):
+        self._data = bytearray()
+        self._pending_bits = 0
+        self._pending_bit_count = 0
+
+    def write(self, value, bit_count):
+        value &= (1 << bit_count) - 1
+        self._pending_bits = (self._pending_bits << bit_count) | value
+        self._pending_bit_count += bit_count
+
+        while 8 <= self._pending_bit_count:
+            self._pending_bit_count -= 8
+            self._data.append(
+                (self._pending_bits >> self._pending_bit_count) & 0xFF,
+                )
+        self._pending_bits &= (1 << self._pending_bit_count) - 1
+
+    def getvalue(self):
+        data = bytearray(self._data)
+        if self._pending_bit_count:
+            padding_bit_count = 8 - self._pending_bit_count
+            data.append(self._pending_bits << padding_bit_count)
+        return bytes(data)
+
+
+class _BitReader(object):
+
+    def __init__(self, data):
+        self._data = bytearray(data)
+        self._position = 0
+
+    def read(self, bit_count):
+        value = 0
+        while bit_count:
+            byte = self._data[self._position >> 3]
+            available_bit_count = 8 - (self._position & 7)
+            read_bit_count = min(available_bit_count, bit_count)
+
+            bits = byte >> (available_bit_count - read_bit_count)
+            bits &= (1 << read_bit_count) - 1
+            value = (value << read_bit_count) | bits
+
+            self._position += read_bit_count
+            bit_count -= read_bit_count
+        return value
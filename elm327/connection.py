@@ -27,7 +27,11 @@ import time
 
 from serial import Serial
 from serial.serialutil import SerialException
-from serial.tools.list_ports import comports
+
+
+_DESYNCHRONIZATION_RESPONSES = ("STOPPED", "BUFFER FULL")
+
+_RESYNCHRONIZATION_TIMEOUT = 1
 
 
 class ConnectionError(Exception):
@@ -35,42 +39,230 @@ class ConnectionError(Exception):
     pass
 
 
+class RequestTimeoutError(ConnectionError):
+
+    pass
+
+
 class SerialConnection(object):
+    """
+    Connection to an ELM327 device over a serial port.
+
+    By default, the port buffers are flushed before every command. In strict
+    prompt mode, the stream is kept synchronized by reading up to the prompt
+    after each command instead, and the buffers are only flushed after a
+    desynchronization is detected (a timeout or an interrupted response).
+
+    If a :class:`~elm327.tracing.Tracer` is given, the timeline of each
+    command is recorded in it.
+
+    A command can be given a deadline (a :func:`time.time` value) after which
+    it's aborted, unless its response has already been received in full. The
+    timeout of the port is shortened to the time left when the response
+    starts being read. The next command waits up to a second (or until its
+    own deadline) for the device to acknowledge the interruption.
+
+    """
 
     _LOGGER = getLogger(__name__ + "SerialConnection")
 
-    def __init__(self, port):
+    def __init__(self, port, strict_prompt=False, tracer=None):
         self._port = port
+        self._strict_prompt = strict_prompt
+        self._tracer = tracer
+
+        self._is_synchronized = False
+        self._is_command_aborted = False
+        self._buffer = ""
+        self._first_byte_time = None
+        self._prompt_time = None
 
-    def send_command(self, data, read_delay=None):
+    def send_command(self, data, read_delay=None, deadline=None):
         """Write "data" to the port and return the response form it"""
-        self._write(data)
+        if self._tracer is not None:
+            return self._send_traced_command(data, read_delay, deadline)
+
+        self._write(data, deadline)
+        if read_delay:
+            time.sleep(read_delay)
+        return self._read(deadline)
+
+    def _send_traced_command(self, data, read_delay, deadline):
+        start_time = time.time()
+        self._write(data, deadline)
+        write_end_time = time.time()
+        self._tracer.add_span(
+            "write",
+            start_time,
+            write_end_time,
+            bytes=len(data) + 2,
+            )
+
         if read_delay:
             time.sleep(read_delay)
+        read_start_time = time.time()
+        if read_delay:
+            self._tracer.add_span("read delay", write_end_time, read_start_time)
+
+        self._first_byte_time = None
+        self._prompt_time = None
+        response = self._read(deadline)
+        end_time = time.time()
+
+        first_byte_time = self._first_byte_time or end_time
+        self._tracer.add_span("adapter wait", read_start_time, first_byte_time)
+        self._tracer.add_span(
+            "byte arrival",
+            first_byte_time,
+            end_time,
+            bytes=len(response),
+            )
+        if self._prompt_time:
+            self._tracer.add_instant_event("prompt", self._prompt_time)
+        self._tracer.add_span(
+            "send command",
+            start_time,
+            end_time,
+            command=data,
+            response=response,
+            )
+
+        return response
+
+    def start_stream(self, data):
+        """Write "data" to the port to start a continuous output"""
+        self._write(data)
+        self._is_synchronized = False
+
+    def read_stream(self):
+        """Return the data output by the device so far in a stream"""
+        data, self._buffer = self._buffer, ""
+        if not data:
+            data = self._port.read(self._port.inWaiting() or 1)
+        return data.replace("\x00", "")
+
+    def stop_stream(self):
+        """Interrupt the device's output and return the rest of it"""
+        self._port.write("\r")
         return self._read()
 
     def close(self):
         self._port.close()
         self._port = None
 
-    def _write(self, data):
-        self._port.flushInput()
-        self._port.flushOutput()
+    def _write(self, data, deadline=None):
+        if self._is_command_aborted:
+            self._resynchronize(deadline)
+
+        if not (self._strict_prompt and self._is_synchronized):
+            self._port.flushInput()
+            self._port.flushOutput()
+            self._buffer = ""
         self._port.write(data)
         self._port.write("\n\r")
 
-    def _read(self):
-        response = ""
-        while True:
-            c = self._port.read(1)
-            if not c or c == ">":
-                break
-            if c == "\x00":
-                continue
-            response += c
+    def _read(self, deadline=None):
+        response, is_prompt_found = self._read_until_prompt(deadline)
+
+        if self._strict_prompt and is_prompt_found and not response.strip():
+            # A prompt left over from a previous command: The actual response
+            # follows it
+            self._LOGGER.debug("Discarding stale prompt")
+            response, is_prompt_found = self._read_until_prompt(deadline)
+
+        if self._strict_prompt:
+            self._is_synchronized = \
+                is_prompt_found and not _is_desynchronization_response(response)
+            if not self._is_synchronized:
+                self._LOGGER.debug("Lost synchronization with the device")
 
         return response
 
+    def _resynchronize(self, deadline):
+        # Wait for the prompt that follows the interruption of the device
+        # (e.g., "STOPPED>"); the buffers are flushed if it doesn't arrive
+        resynchronization_deadline = time.time() + _RESYNCHRONIZATION_TIMEOUT
+        if deadline is not None:
+            resynchronization_deadline = \
+                min(resynchronization_deadline, deadline)
+        _, is_prompt_found = self._read_until_prompt(
+            resynchronization_deadline,
+            is_abortable=False,
+            )
+        self._is_synchronized = is_prompt_found
+
+        if not is_prompt_found and deadline is not None and \
+                deadline <= time.time():
+            raise RequestTimeoutError(
+                "The deadline of the command expired before the device "
+                "acknowledged the previous interruption",
+                )
+        self._is_command_aborted = False
+
+    def _read_until_prompt(self, deadline, is_abortable=True):
+        if deadline is None:
+            return self._read_chunks_until_prompt(deadline, is_abortable)
+
+        # The timeout is only set once per response because changing it
+        # reconfigures the port
+        port_timeout = self._port.timeout
+        remaining_time = max(deadline - time.time(), 0)
+        if port_timeout is not None:
+            remaining_time = min(remaining_time, port_timeout)
+        self._port.timeout = remaining_time
+        try:
+            return self._read_chunks_until_prompt(deadline, is_abortable)
+        finally:
+            self._port.timeout = port_timeout
+
+    def _read_chunks_until_prompt(self, deadline, is_abortable):
+        if self._tracer is None:
+            read = self._port.read
+        else:
+            read = self._read_traced
+
+        response = ""
+        data, self._buffer = self._buffer, ""
+        while ">" not in data:
+            response += data
+            if deadline is None:
+                data = read(1)
+            else:
+                # Everything that has arrived is taken at once. Whatever
+                # follows the prompt is kept for the next response
+                data = read(self._port.inWaiting() or 1)
+            if not data:
+                if is_abortable and deadline is not None and \
+                        deadline <= time.time():
+                    self._abort_command()
+                return response.replace("\x00", ""), False
+
+        response_end, _, self._buffer = data.partition(">")
+        response += response_end
+        return response.replace("\x00", ""), True
+
+    def _abort_command(self):
+        # Any character interrupts the device. The rest of its response is
+        # read before the next command
+        self._port.write("\r")
+        self._is_synchronized = False
+        self._is_command_aborted = True
+        raise RequestTimeoutError("The deadline of the command expired")
+
+    def _read_traced(self, size):
+        data = self._port.read(size)
+
+        if data and self._first_byte_time is None:
+            self._first_byte_time = time.time()
+        if ">" in data:
+            self._prompt_time = time.time()
+
+        return data
+
+
+def _is_desynchronization_response(response):
+    return any(marker in response for marker in _DESYNCHRONIZATION_RESPONSES)
+
 
 class SerialConnectionFactory(object):
 
@@ -78,14 +270,25 @@ class SerialConnectionFactory(object):
 
     _LOGGER = getLogger(__name__ + "SerialConnectionFactory")
 
-    def __init__(self, port_class=Serial, **port_init_kwargs):
+    def __init__(
+        self,
+        port_class=Serial,
+        strict_prompt=False,
+        tracer=None,
+        **port_init_kwargs
+        ):
         self._port_class = port_class
+        self._strict_prompt = strict_prompt
+        self._tracer = tracer
 
         port_init_kwargs.setdefault('baudrate', self._DEFAULT_BAUDRATE)
         self._port_init_kwargs = port_init_kwargs
 
     def auto_connect(self, available_ports=None):
         if not available_ports:
+            # Imported here because scanning the system is rarely needed and
+            # the module is slow to import
+            from serial.tools.list_ports import comports
             ports = comports()
             available_ports = [port[0] for port in ports]
 
@@ -102,7 +305,7 @@ class SerialConnectionFactory(object):
     def connect(self, device_name):
         port = self._open_port(device_name)
         self._LOGGER.info("Connected to %r", device_name)
-        connection = SerialConnection(port)
+        connection = SerialConnection(port, self._strict_prompt, self._tracer)
         return connection
 
     def _open_port(self, device_name):
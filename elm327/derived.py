@@ -0,0 +1,317 @@
+################################################################################
+# The MIT License (MIT)
+#
+# Copyright (c) 2014 Francisco Ruiz
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+################################################################################
+
+from collections import defaultdict
+from collections import deque
+from functools import partial
+from heapq import merge
+
+from elm327.pcm_values import ENGINE_FUEL_RATE
+from elm327.pcm_values import PCMValue
+from elm327.pcm_values import VEHICLE_SPEED
+
+
+_SECONDS_PER_HOUR = 3600.0
+
+
+class DerivedChannel(object):
+    """
+    Channel computed from other channels.
+
+    The inputs can be :class:`~elm327.pcm_values.PCMValueDefinition`
+    instances or other derived channels. "function" receives the timestamp and
+    the latest value of each input, and it's only called once all of them
+    have a value.
+
+    Functions that keep state between calls (like :class:`Integrator`) must
+    be given as a "function_factory" instead, so that each evaluation (live
+    or batch) gets its own instance.
+
+    """
+
+    def __init__(
+        self,
+        name,
+        inputs,
+        function=None,
+        unit=None,
+        function_factory=None,
+        ):
+        if (function is None) == (function_factory is None):
+            raise ValueError(
+                "Either a function or a function factory must be given",
+                )
+
+        self.name = name
+        self.inputs = tuple(inputs)
+        self.function = function
+        self.function_factory = function_factory
+        self.unit = unit
+
+    def make_function(self):
+        """Return the function, or a new instance of it if it has state"""
+        if self.function_factory is None:
+            return self.function
+        return self.function_factory()
+
+    def __repr__(self):
+        return "{}(name={!r})".format(self.__class__.__name__, self.name)
+
+
+class Integrator(object):
+    """Integral of a channel over time, by the trapezoidal rule"""
+
+    def __init__(self, scale=1):
+        self._scale = scale
+
+        self._total = 0
+        self._previous_timestamp = None
+        self._previous_value = None
+
+    def __call__(self, timestamp, value):
+        if self._previous_timestamp is not None:
+            elapsed_time = timestamp - self._previous_timestamp
+            mean_value = (value + self._previous_value) / 2.0
+            self._total += mean_value * elapsed_time * self._scale
+
+        self._previous_timestamp = timestamp
+        self._previous_value = value
+        return self._total
+
+
+class MovingAverage(object):
+    """Average of the last "window_size" values of a channel"""
+
+    def __init__(self, window_size):
+        self._values = deque(maxlen=window_size)
+        self._sum = 0
+
+    def __call__(self, timestamp, value):
+        if len(self._values) == self._values.maxlen:
+            self._sum -= self._values[0]
+        self._values.append(value)
+        self._sum += value
+        return self._sum / float(len(self._values))
+
+
+class DerivedChannelEngine(object):
+    """
+    Incremental evaluator of derived channels.
+
+    When a sample of a channel is received, only the derived channels that
+    depend on it (directly or not) are recomputed, in dependency order.
+
+    Batches are evaluated with their own latest values and instances of the
+    stateful functions, so they don't interfere with live updates or with
+    each other.
+
+    """
+
+    def __init__(self, derived_channels):
+        dependants_by_channel = defaultdict(list)
+        for derived_channel in derived_channels:
+            for input_channel in derived_channel.inputs:
+                dependants_by_channel[input_channel].append(derived_channel)
+
+        evaluation_order = _sort_topologically(derived_channels)
+        self._affected_channels_by_source = {}
+        for source_channel in dependants_by_channel:
+            affected_channels = \
+                _find_dependants(source_channel, dependants_by_channel)
+            self._affected_channels_by_source[source_channel] = sorted(
+                affected_channels,
+                key=evaluation_order.index,
+                )
+
+        self._derived_channels = derived_channels
+        self._latest_values = {}
+        self._functions_by_channel = self._make_functions()
+
+    def update(self, channel, pcm_value, timestamp):
+        """Record a sample and return the updated values of derived channels"""
+        self._latest_values[channel] = \
+            None if pcm_value is None else pcm_value.value
+        updated_values = self._update_dependants(
+            channel,
+            timestamp,
+            self._latest_values,
+            self._functions_by_channel,
+            )
+
+        pcm_values = {}
+        for derived_channel, value in updated_values:
+            if value is None:
+                pcm_values[derived_channel] = None
+            else:
+                pcm_values[derived_channel] = \
+                    PCMValue(value, derived_channel.unit)
+        return pcm_values
+
+    def get_value(self, channel):
+        value = self._latest_values.get(channel)
+        if value is None:
+            return None
+        return PCMValue(value, _get_channel_unit(channel))
+
+    def process_batch(self, samples_by_channel):
+        """
+        Evaluate the derived channels over recorded samples.
+
+        "samples_by_channel" maps channels to sequences of (timestamp, value)
+        pairs sorted by timestamp. The samples of all the channels are
+        processed in timestamp order, and the values of each derived channel
+        are returned as a list of (timestamp, value) pairs.
+
+        """
+        sample_sequences = [
+            _iter_channel_samples(channel, samples)
+            for channel, samples in samples_by_channel.items()
+            ]
+
+        latest_values = {}
+        functions_by_channel = self._make_functions()
+        derived_samples_by_channel = defaultdict(list)
+        for timestamp, channel, value in merge(*sample_sequences):
+            latest_values[channel] = value
+            updated_values = self._update_dependants(
+                channel,
+                timestamp,
+                latest_values,
+                functions_by_channel,
+                )
+            for derived_channel, derived_value in updated_values:
+                derived_samples = derived_samples_by_channel[derived_channel]
+                derived_samples.append((timestamp, derived_value))
+
+        return dict(derived_samples_by_channel)
+
+    def _make_functions(self):
+        return {
+            derived_channel: derived_channel.make_function()
+            for derived_channel in self._derived_channels
+            }
+
+    def _update_dependants(
+        self,
+        channel,
+        timestamp,
+        latest_values,
+        functions_by_channel,
+        ):
+        affected_channels = self._affected_channels_by_source.get(channel, ())
+        updated_values = []
+        for derived_channel in affected_channels:
+            input_values = \
+                [latest_values.get(input_) for input_ in derived_channel.inputs]
+            if None in input_values:
+                continue
+
+            function = functions_by_channel[derived_channel]
+            value = function(timestamp, *input_values)
+            latest_values[derived_channel] = value
+            updated_values.append((derived_channel, value))
+
+        return updated_values
+
+
+def _get_channel_unit(channel):
+    if isinstance(channel, DerivedChannel):
+        return channel.unit
+    return getattr(channel.parser, "unit", None)
+
+
+def _iter_channel_samples(channel, samples):
+    for timestamp, value in samples:
+        yield timestamp, channel, value
+
+
+def _find_dependants(channel, dependants_by_channel):
+    dependants = set()
+    pending_channels = [channel]
+    while pending_channels:
+        for dependant in dependants_by_channel.get(pending_channels.pop(), ()):
+            if dependant not in dependants:
+                dependants.add(dependant)
+                pending_channels.append(dependant)
+    return dependants
+
+
+def _sort_topologically(derived_channels):
+    sorted_channels = []
+    visited_channels = set()
+    channels_in_progress = set()
+
+    def visit(channel):
+        if channel in visited_channels:
+            return
+        if channel in channels_in_progress:
+            raise ValueError("Cyclic dependency in {!r}".format(channel))
+
+        channels_in_progress.add(channel)
+        for input_channel in getattr(channel, "inputs", ()):
+            visit(input_channel)
+        channels_in_progress.remove(channel)
+
+        visited_channels.add(channel)
+        if isinstance(channel, DerivedChannel):
+            sorted_channels.append(channel)
+
+    for derived_channel in derived_channels:
+        visit(derived_channel)
+
+    return sorted_channels
+
+
+def _compute_fuel_economy(timestamp, fuel_rate, vehicle_speed):
+    if vehicle_speed <= 0:
+        return None
+    return fuel_rate * 100.0 / vehicle_speed
+
+
+def make_distance_channel():
+    """Return a channel with the distance travelled, in km"""
+    return DerivedChannel(
+        "Distance",
+        [VEHICLE_SPEED],
+        unit="km",
+        function_factory=partial(Integrator, scale=1 / _SECONDS_PER_HOUR),
+        )
+
+
+def make_fuel_used_channel():
+    """Return a channel with the fuel used, in litres"""
+    return DerivedChannel(
+        "Fuel used",
+        [ENGINE_FUEL_RATE],
+        unit="L",
+        function_factory=partial(Integrator, scale=1 / _SECONDS_PER_HOUR),
+        )
+
+
+FUEL_ECONOMY = DerivedChannel(
+    "Fuel economy",
+    [ENGINE_FUEL_RATE, VEHICLE_SPEED],
+    _compute_fuel_economy,
+    unit="L/100km",
+    )
@@ -0,0 +1,196 @@
+################################################################################
+# The MIT License (MIT)
+#
+# Copyright (c) 2014 Francisco Ruiz
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+################################################################################
+
+from collections import namedtuple
+from logging import getLogger
+import time
+
+
+_MONITOR_ALL_COMMAND = "AT MA"
+
+_BUFFER_FULL_RESPONSE = "BUFFER FULL"
+
+_STANDARD_ID_WORDS_COUNT = 1
+
+_EXTENDED_ID_WORDS_COUNT = 4
+
+
+CANFrame = namedtuple("CANFrame", ("can_id", "data", "timestamp"))
+
+
+class CANFrameParser(object):
+    """
+    Incremental parser of the frames output by the device while monitoring.
+
+    The data can be fed in chunks of any size: A frame split between two
+    chunks is parsed once its end is received. Headers must be enabled
+    ("AT H1") and spaces must not be disabled.
+
+    """
+
+    _LOGGER = getLogger(__name__ + "CANFrameParser")
+
+    def __init__(self, extended_ids=False):
+        if extended_ids:
+            self._id_words_count = _EXTENDED_ID_WORDS_COUNT
+        else:
+            self._id_words_count = _STANDARD_ID_WORDS_COUNT
+
+        self._pending_data = ""
+
+        self.overruns_count = 0
+        self.is_prompt_found = False
+
+    def feed(self, data, timestamp=None):
+        """Parse "data" and return the frames completed by it"""
+        if timestamp is None:
+            timestamp = time.time()
+
+        if ">" in data:
+            self.is_prompt_found = True
+            data = data.replace(">", "\r")
+
+        lines = (self._pending_data + data).replace("\n", "\r").split("\r")
+        self._pending_data = lines.pop()
+
+        frames = []
+        for line in lines:
+            frame = self._parse_line(line, timestamp)
+            if frame:
+                frames.append(frame)
+        return frames
+
+    def _parse_line(self, line, timestamp):
+        line = line.strip()
+        if not line:
+            return None
+
+        if line == _BUFFER_FULL_RESPONSE:
+            self._LOGGER.debug("The device's buffer overran")
+            self.overruns_count += 1
+            return None
+
+        words = line.split()
+        if len(words) <= self._id_words_count:
+            return None
+
+        try:
+            can_id = int("".join(words[:self._id_words_count]), 16)
+            data = tuple(int(word, 16) for word in words[self._id_words_count:])
+        except ValueError:
+            self._LOGGER.debug("Ignoring unexpected line %r", line)
+            return None
+
+        return CANFrame(can_id, data, timestamp)
+
+
+class CANMonitor(object):
+    """
+    Passive reader of the traffic in the CAN bus ("AT MA" mode).
+
+    Many vehicles broadcast values like the engine RPM or the vehicle speed
+    at a much higher rate than they can be polled. The latest frame received
+    for each CAN id is kept in :attr:`latest_frames`, and the frames with a
+    decoder are decoded into :attr:`latest_values`.
+
+    "decoders" maps CAN ids to callables with the same signature as the
+    parsers in a :class:`~elm327.pcm_values.PCMValueDefinition`, which
+    receive all the data bytes in the frame.
+
+    If the device's buffer overruns, monitoring is restarted.
+
+    """
+
+    _LOGGER = getLogger(__name__ + "CANMonitor")
+
+    def __init__(
+        self,
+        connection,
+        decoders=None,
+        receive_address=None,
+        extended_ids=False,
+        ):
+        self._connection = connection
+        self._decoders = decoders or {}
+        self._receive_address = receive_address
+
+        self._parser = CANFrameParser(extended_ids)
+        self._is_monitoring = False
+
+        self.latest_frames = {}
+        self.latest_values = {}
+
+    @property
+    def overruns_count(self):
+        return self._parser.overruns_count
+
+    def start(self):
+        self._connection.send_command("AT H1")
+        if self._receive_address is not None:
+            self._connection.send_command(
+                "AT CRA {:X}".format(self._receive_address),
+                )
+        self._start_monitoring()
+
+    def poll(self):
+        """Process the frames received since the last poll and return them"""
+        if not self._is_monitoring:
+            return []
+
+        data = self._connection.read_stream()
+        frames = self._process_data(data)
+
+        if self._parser.is_prompt_found:
+            self._LOGGER.debug("Monitoring was interrupted, restarting")
+            self._start_monitoring()
+
+        return frames
+
+    def stop(self):
+        frames = []
+        if self._is_monitoring:
+            data = self._connection.stop_stream()
+            frames = self._process_data(data)
+            self._is_monitoring = False
+
+        if self._receive_address is not None:
+            self._connection.send_command("AT CRA")
+        self._connection.send_command("AT H0")
+
+        return frames
+
+    def _start_monitoring(self):
+        self._parser.is_prompt_found = False
+        self._connection.start_stream(_MONITOR_ALL_COMMAND)
+        self._is_monitoring = True
+
+    def _process_data(self, data):
+        frames = self._parser.feed(data)
+        for frame in frames:
+            self.latest_frames[frame.can_id] = frame
+
+            decoder = self._decoders.get(frame.can_id)
+            if decoder:
+                self.latest_values[frame.can_id] = decoder(frame.data)
+        return frames
@@ -0,0 +1,355 @@
+################################################################################
+# The MIT License (MIT)
+#
+# Copyright (c) 2014 Francisco Ruiz
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+################################################################################
+
+from logging import getLogger
+from select import select
+from threading import Lock
+import socket
+import time
+
+from elm327.connection import ConnectionError
+from elm327.connection import RequestTimeoutError
+
+
+_URL_SCHEME = "tcp://"
+
+_DEFAULT_PORT = 35000
+
+_DEFAULT_TIMEOUT = 5
+
+_RESYNCHRONIZATION_TIMEOUT = 1
+
+
+class SocketConnection(object):
+    """
+    Connection to an ELM327 device over TCP, like Wi-Fi adapters.
+
+    The contract is the same as :class:`~elm327.connection.SerialConnection`.
+
+    """
+
+    _LOGGER = getLogger(__name__ + "SocketConnection")
+
+    _RECEIVE_SIZE = 4096
+
+    def __init__(self, sock, address, release_callback=None):
+        self._socket = sock
+        self.address = address
+        self._release_callback = release_callback
+
+        self._buffer = ""
+        self._is_synchronized = True
+        self.last_used_time = time.time()
+
+    def send_command(self, data, read_delay=None, deadline=None):
+        """Write "data" to the socket and return the response from it"""
+        try:
+            self._write(data, deadline)
+            if read_delay:
+                time.sleep(read_delay)
+            response = self._read(deadline)
+        except socket.error as exc:
+            raise ConnectionError(str(exc))
+
+        self.last_used_time = time.time()
+        return response
+
+    def start_stream(self, data):
+        """Write "data" to the socket to start a continuous output"""
+        try:
+            self._write(data)
+        except socket.error as exc:
+            raise ConnectionError(str(exc))
+
+    def read_stream(self):
+        """Return the data output by the device so far in a stream"""
+        data, self._buffer = self._buffer, ""
+        if not data:
+            try:
+                data = self._socket.recv(self._RECEIVE_SIZE)
+            except socket.timeout:
+                pass
+            except socket.error as exc:
+                raise ConnectionError(str(exc))
+        return data.replace("\x00", "")
+
+    def stop_stream(self):
+        """Interrupt the device's output and return the rest of it"""
+        try:
+            self._socket.sendall("\r")
+            response = self._read()
+        except socket.error as exc:
+            raise ConnectionError(str(exc))
+        return response
+
+    def close(self):
+        """Close the connection or hand it back to its pool"""
+        if self._socket is None:
+            return
+
+        if self._release_callback:
+            # The pool gets a handle of its own, so this one cannot release
+            # the socket again once somebody else has acquired it
+            self._release_callback(self._detach())
+        else:
+            self.disconnect()
+
+    def disconnect(self):
+        self._socket.close()
+        self._socket = None
+
+    def is_alive(self):
+        """Check that the connection hasn't been closed by the device"""
+        if self._socket is None:
+            return False
+
+        try:
+            readable_sockets = select([self._socket], [], [], 0)[0]
+            if not readable_sockets:
+                return True
+            data = self._socket.recv(self._RECEIVE_SIZE, socket.MSG_PEEK)
+        except socket.error:
+            return False
+        return bool(data)
+
+    def _detach(self):
+        connection = SocketConnection(
+            self._socket,
+            self.address,
+            self._release_callback,
+            )
+        connection._buffer = self._buffer
+        connection._is_synchronized = self._is_synchronized
+        connection.last_used_time = self.last_used_time
+
+        self._socket = None
+        self._release_callback = None
+        return connection
+
+    def _write(self, data, deadline=None):
+        if not self._is_synchronized:
+            self._resynchronize(deadline)
+
+        # Anything left over from the previous command is discarded, which is
+        # what flushing the input buffer achieves on a serial port
+        self._buffer = ""
+        self._discard_pending_input()
+        self._socket.sendall(data + "\n\r")
+
+    def _resynchronize(self, deadline):
+        # Discard the rest of the response to an aborted command, up to the
+        # prompt that follows the interruption (e.g., "STOPPED>")
+        resynchronization_deadline = time.time() + _RESYNCHRONIZATION_TIMEOUT
+        if deadline is not None:
+            resynchronization_deadline = \
+                min(resynchronization_deadline, deadline)
+        self._is_synchronized = True
+        self._read(resynchronization_deadline, is_abortable=False)
+
+        if not self._is_synchronized and deadline is not None and \
+                deadline <= time.time():
+            raise RequestTimeoutError(
+                "The deadline of the command expired before the device "
+                "acknowledged the previous interruption",
+                )
+        self._is_synchronized = True
+
+    def _discard_pending_input(self):
+        while select([self._socket], [], [], 0)[0]:
+            if not self._socket.recv(self._RECEIVE_SIZE):
+                break
+
+    def _read(self, deadline=None, is_abortable=True):
+        while ">" not in self._buffer:
+            try:
+                chunk = self._receive_before(deadline)
+            except socket.timeout:
+                if is_abortable and deadline is not None and \
+                        deadline <= time.time():
+                    self._abort_command()
+                # The device may still answer, so the response must be
+                # discarded before the next command
+                self._is_synchronized = False
+                break
+            if not chunk:
+                break
+            self._buffer += chunk
+
+        response, _, self._buffer = self._buffer.partition(">")
+        return response.replace("\x00", "")
+
+    def _receive_before(self, deadline):
+        if deadline is None:
+            return self._socket.recv(self._RECEIVE_SIZE)
+
+        socket_timeout = self._socket.gettimeout()
+        remaining_time = deadline - time.time()
+        if remaining_time <= 0:
+            # Only what has already arrived can be received
+            if not select([self._socket], [], [], 0)[0]:
+                raise socket.timeout()
+            return self._socket.recv(self._RECEIVE_SIZE)
+        if socket_timeout is not None:
+            remaining_time = min(remaining_time, socket_timeout)
+
+        self._socket.settimeout(remaining_time)
+        try:
+            chunk = self._socket.recv(self._RECEIVE_SIZE)
+        finally:
+            self._socket.settimeout(socket_timeout)
+        return chunk
+
+    def _abort_command(self):
+        # Any character interrupts the device. The rest of its response is
+        # discarded before the next command
+        self._socket.sendall("\r")
+        self._is_synchronized = False
+        raise RequestTimeoutError("The deadline of the command expired")
+
+
+class SocketConnectionPool(object):
+    """
+    Reusable connections to TCP devices, keyed by "host:port".
+
+    Connections are health-checked before being reused and those that have
+    been idle for longer than "max_idle_time" seconds are closed.
+
+    """
+
+    _LOGGER = getLogger(__name__ + "SocketConnectionPool")
+
+    def __init__(self, max_idle_time=60, timeout=_DEFAULT_TIMEOUT):
+        self._max_idle_time = max_idle_time
+        self._timeout = timeout
+
+        self._lock = Lock()
+        self._idle_connections_by_address = {}
+
+    def acquire(self, host, port):
+        address = _format_address(host, port)
+        self._evict_idle_connections()
+
+        with self._lock:
+            idle_connections = \
+                self._idle_connections_by_address.get(address, [])
+            while idle_connections:
+                connection = idle_connections.pop()
+                if connection.is_alive():
+                    self._LOGGER.debug("Reusing connection to %r", address)
+                    return connection
+                connection.disconnect()
+
+        sock = _open_socket(host, port, self._timeout)
+        connection = SocketConnection(sock, address, self.release)
+        return connection
+
+    def release(self, connection):
+        with self._lock:
+            idle_connections = self._idle_connections_by_address.setdefault(
+                connection.address,
+                [],
+                )
+            if not connection.is_alive():
+                connection.disconnect()
+                return
+
+            connection.last_used_time = time.time()
+            idle_connections.append(connection)
+
+    def clear(self):
+        with self._lock:
+            for connections in self._idle_connections_by_address.values():
+                for connection in connections:
+                    connection.disconnect()
+            self._idle_connections_by_address.clear()
+
+    def _evict_idle_connections(self):
+        oldest_allowed_time = time.time() - self._max_idle_time
+        with self._lock:
+            for connections in self._idle_connections_by_address.values():
+                for connection in list(connections):
+                    if connection.last_used_time < oldest_allowed_time:
+                        self._LOGGER.debug(
+                            "Evicting idle connection to %r",
+                            connection.address,
+                            )
+                        connections.remove(connection)
+                        connection.disconnect()
+
+
+class SocketConnectionFactory(object):
+
+    _LOGGER = getLogger(__name__ + "SocketConnectionFactory")
+
+    def __init__(self, pool=None, timeout=_DEFAULT_TIMEOUT):
+        self._pool = pool
+        self._timeout = timeout
+
+    def connect(self, url):
+        """Connect to the device at a URL like tcp://192.168.0.10:35000"""
+        host, port = _parse_url(url)
+
+        if self._pool:
+            connection = self._pool.acquire(host, port)
+        else:
+            sock = _open_socket(host, port, self._timeout)
+            connection = SocketConnection(sock, _format_address(host, port))
+
+        self._LOGGER.info("Connected to %r", url)
+        return connection
+
+
+def _parse_url(url):
+    if not url.startswith(_URL_SCHEME):
+        raise ConnectionError("Unsupported URL {!r}".format(url))
+
+    address = url[len(_URL_SCHEME):].rstrip("/")
+    host, separator, port = address.rpartition(":")
+    if not separator:
+        host, port = address, _DEFAULT_PORT
+
+    try:
+        port = int(port)
+    except ValueError:
+        raise ConnectionError("Invalid port in URL {!r}".format(url))
+
+    if not host:
+        raise ConnectionError("Missing host in URL {!r}".format(url))
+
+    return host, port
+
+
+def _format_address(host, port):
+    return "{}:{}".format(host, port)
+
+
+def _open_socket(host, port, timeout):
+    try:
+        sock = socket.create_connection((host, port), timeout)
+    except socket.error as exc:
+        raise ConnectionError(str(exc))
+
+    sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+    return sock
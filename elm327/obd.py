@@ -23,16 +23,65 @@
 ################################################################################
 
 from logging import getLogger
+import json
+import os
 
 
+ADAPTER_RESET_COMMAND = "AT Z"
+
+ADAPTER_WARM_START_COMMAND = "AT WS"
+
+_AUTOMATIC_PROTOCOL_NUMBER = "0"
+
 _OBD_RESPONSE_NO_DATA = "NO DATA"
 
 _OBD_RESPONSE_UNSUPPORTED_COMMAND = "?"
 
+_OBD_RESPONSE_MODE_OFFSET = 0x40
+
+_OBD_NEGATIVE_RESPONSE_ID = 0x7F
+
+_RESPONSE_PENDING_CODE = 0x78
+
+# Negative response codes meaning that the request will never be accepted
+# (service or sub-function not supported, request out of range)
+_PERMANENT_NEGATIVE_RESPONSE_CODES = frozenset((0x11, 0x12, 0x31))
+
+# Negative response codes meaning that a batched request isn't accepted,
+# including "incorrect message length" for too many identifiers
+_BATCH_REJECTION_RESPONSE_CODES = \
+    _PERMANENT_NEGATIVE_RESPONSE_CODES | frozenset((0x13,))
+
+_SUPPORTED_PIDS_RANGE_SIZE = 0x20
+
+_STORED_TROUBLE_CODES_MODE = 0x03
+
+_PENDING_TROUBLE_CODES_MODE = 0x07
+
+_PERMANENT_TROUBLE_CODES_MODE = 0x0A
+
+_TROUBLE_CODE_SYSTEMS = "PCBU"
+
+_FREEZE_FRAME_MODE = 0x02
+
+_FREEZE_FRAME_MAX_PIDS_PER_REQUEST = 3
+
+_CURRENT_DATA_MODE = 0x01
+
+_CURRENT_DATA_MAX_PIDS_PER_REQUEST = 6
+
+_DATA_IDENTIFIER_MODE = 0x22
+
+_DATA_IDENTIFIER_MAX_DIDS_PER_REQUEST = 1
+
+_STN_DEVICE_ID_PREFIX = "STN"
+
 _INT_TO_HEX_WORD_FORMATTER = "{:0=2X}"
 
 _INT_TO_HEX_WORD_FORMATTER_PRETTY = "{:0=#4x}"
 
+_DATA_IDENTIFIER_FORMATTER_PRETTY = "{:0=#6x}"
+
 
 class ELMError(Exception):
 
@@ -45,35 +94,137 @@ class ValueNotAvailableError(ELMError):
 
 
 class OBDInterface(object):
+    """
+    Interface to the PCM of a vehicle through an ELM327 device.
+
+    The device is fully reset on initialization unless another
+    "reset_command" is given: :data:`ADAPTER_WARM_START_COMMAND` is faster,
+    and None skips the reset when the device is known to be in a good state.
+
+    If a "protocol_cache" is given, the protocol detected by the device for
+    the vehicle identified by "vehicle_id" is stored in it, so that it's set
+    directly in subsequent sessions instead of being searched again.
+
+    If a :class:`~elm327.tracing.Tracer` is given, the readings of PCM values
+    are recorded in it.
+
+    Devices with STN firmware (like OBDLink) are detected when several values
+    are read at once, in which case their extended commands are used.
+
+    """
 
     _LOGGER = getLogger(__name__ + "OBDInterface")
 
-    def __init__(self, connection):
+    def __init__(
+        self,
+        connection,
+        reset_command=ADAPTER_RESET_COMMAND,
+        protocol_cache=None,
+        vehicle_id=None,
+        tracer=None,
+        ):
         self._connection = connection
+        self._protocol_cache = protocol_cache
+        self._vehicle_id = vehicle_id
+        self._tracer = tracer
 
         self._unsupported_commands = []
+        self._supported_pids_by_mode = {}
+        self._is_protocol_cached = protocol_cache is None
+        self._is_stn_device = None
+        self._modes_without_batching = set()
 
-        self._send_command("AT Z")
+        if reset_command:
+            self._send_command(reset_command)
         self._send_command("AT E0")
 
-    def _send_command(self, data, read_delay=None):
-        response = self._connection.send_command(data, read_delay)
+        if protocol_cache is not None:
+            self._set_cached_protocol()
+
+    def _set_cached_protocol(self):
+        protocol_number = self._protocol_cache.get(self._vehicle_id)
+        if protocol_number is None:
+            return
+
+        # The automatic search is kept as a fallback in case the protocol
+        # is wrong
+        self._send_command("AT SP A{}".format(protocol_number))
+        self._is_protocol_cached = True
+
+    def _cache_detected_protocol(self):
+        response = self._send_command("AT DPN")
+        protocol_number = response.lstrip("A")
+        if protocol_number and protocol_number != _AUTOMATIC_PROTOCOL_NUMBER:
+            self._protocol_cache.set(self._vehicle_id, protocol_number)
+            self._is_protocol_cached = True
+
+    def _send_command(self, data, read_delay=None, deadline=None):
+        if deadline is None:
+            response = self._connection.send_command(data, read_delay)
+        else:
+            response = self._connection.send_command(data, read_delay, deadline)
         return response.strip()
 
-    def read_pcm_value(self, pcm_value_definition, read_delay=None):
+    def read_pcm_value(
+        self,
+        pcm_value_definition,
+        read_delay=None,
+        deadline=None,
+        ):
+        """
+        Read the value of "pcm_value_definition".
+
+        If a "deadline" (a :func:`time.time` value) is given, the request is
+        aborted with :class:`~elm327.connection.RequestTimeoutError` when it
+        expires.
+
+        """
+        if self._tracer is None:
+            return self._read_pcm_value(
+                pcm_value_definition,
+                read_delay,
+                deadline,
+                )
+
+        obd_command = pcm_value_definition.command
+        span = self._tracer.span("read PCM value", command=repr(obd_command))
+        with span as span_args:
+            pcm_value = self._read_pcm_value(
+                pcm_value_definition,
+                read_delay,
+                deadline,
+                )
+            span_args["result"] = repr(pcm_value)
+        return pcm_value
+
+    def _read_pcm_value(self, pcm_value_definition, read_delay, deadline):
         obd_command = pcm_value_definition.command
         if obd_command in self._unsupported_commands:
             raise ValueNotAvailableError()
 
         command_data = ' '.join(obd_command.to_hex_words())
-        response_data = self._send_command(command_data, read_delay)
+        response_data = \
+            self._send_command(command_data, read_delay, deadline)
 
         try:
-            response = self._make_pcm_value(response_data, pcm_value_definition)
+            if self._tracer is None:
+                response = self._make_pcm_value(
+                    response_data,
+                    pcm_value_definition,
+                    )
+            else:
+                with self._tracer.span("decode", bytes=len(response_data)):
+                    response = self._make_pcm_value(
+                        response_data,
+                        pcm_value_definition,
+                        )
         except ValueNotAvailableError:
             self._unsupported_commands.append(obd_command)
             raise
 
+        if response is not None and not self._is_protocol_cached:
+            self._cache_detected_protocol()
+
         return response
 
     @staticmethod
@@ -84,11 +235,311 @@ class OBDInterface(object):
         if response_raw == _OBD_RESPONSE_UNSUPPORTED_COMMAND:
             raise ValueNotAvailableError()
 
-        response_words = _convert_raw_response_to_words(response_raw)
-        raw_data = tuple(response_words[2:])
+        request_words = _get_command_words(pcm_value_definition.command)
+        mode = request_words[0]
+        response_header = [mode + _OBD_RESPONSE_MODE_OFFSET] + request_words[1:]
+        header_size = len(response_header)
+        for message in _convert_raw_response_to_messages(response_raw):
+            if message[:header_size] == response_header:
+                raw_data = tuple(message[header_size:])
+                return pcm_value_definition.parser(raw_data)
+
+        negative_response_codes = \
+            _get_negative_response_codes(response_raw, mode)
+        if _PERMANENT_NEGATIVE_RESPONSE_CODES.intersection(
+                negative_response_codes):
+            raise ValueNotAvailableError()
+        if negative_response_codes:
+            # For example, "conditions not correct": The value may be
+            # available later
+            return None
 
-        pcm_value = pcm_value_definition.parser(raw_data)
-        return pcm_value
+        raise ELMError("Unexpected response {!r}".format(response_raw))
+
+    def read_pcm_values(
+        self,
+        pcm_value_definitions,
+        max_pids_per_request=_CURRENT_DATA_MAX_PIDS_PER_REQUEST,
+        read_delay=None,
+        max_data_identifiers_per_request=_DATA_IDENTIFIER_MAX_DIDS_PER_REQUEST,
+        deadline=None,
+        ):
+        """
+        Read several values, returning them by definition.
+
+        Current data (mode 01) values whose definitions declare their size in
+        bytes are read several per request; CAN PCMs accept up to six. Values
+        that aren't available are left out.
+
+        Manufacturer-specific values (mode 22) whose definitions declare their
+        size can be read several per request too, but how many is up to each
+        ECU, so by default they are read one at a time.
+
+        On STN devices, batched requests are sent with "STPX" so that the
+        device returns as soon as the response arrives instead of waiting for
+        more PCMs to respond. If the protocol or the ECU rejects a batched
+        request, the values in that mode are read one at a time from then on.
+
+        The "deadline" applies to every request, as in :meth:`read_pcm_value`.
+
+        """
+        max_batch_sizes_by_mode = {
+            _CURRENT_DATA_MODE: max_pids_per_request,
+            _DATA_IDENTIFIER_MODE: max_data_identifiers_per_request,
+            }
+        batched_definitions_by_mode = {
+            mode: [] for mode in max_batch_sizes_by_mode
+            }
+        pcm_values = {}
+        for definition in pcm_value_definitions:
+            command = definition.command
+            if command in self._unsupported_commands:
+                continue
+
+            if isinstance(command, (OBDCommand, DataIdentifierCommand)) and \
+                    command.mode in batched_definitions_by_mode and \
+                    command.mode not in self._modes_without_batching and \
+                    definition.byte_count is not None:
+                batched_definitions_by_mode[command.mode].append(definition)
+            else:
+                self._read_pcm_value_into(
+                    definition,
+                    pcm_values,
+                    read_delay,
+                    deadline,
+                    )
+
+        for mode in sorted(batched_definitions_by_mode):
+            definition_batches = _batch_pcm_value_definitions(
+                batched_definitions_by_mode[mode],
+                max_batch_sizes_by_mode[mode],
+                )
+            for definition_batch in definition_batches:
+                if len(definition_batch) == 1 or \
+                        mode in self._modes_without_batching:
+                    for definition in definition_batch:
+                        self._read_pcm_value_into(
+                            definition,
+                            pcm_values,
+                            read_delay,
+                            deadline,
+                            )
+                else:
+                    batch_values = self._read_pcm_value_batch(
+                        definition_batch,
+                        mode,
+                        read_delay,
+                        deadline,
+                        )
+                    pcm_values.update(batch_values)
+
+        return pcm_values
+
+    def _read_pcm_value_into(
+        self,
+        definition,
+        pcm_values,
+        read_delay,
+        deadline,
+        ):
+        try:
+            pcm_value = self.read_pcm_value(definition, read_delay, deadline)
+        except ValueNotAvailableError:
+            return
+        pcm_values[definition] = pcm_value
+
+    def _read_pcm_value_batch(
+        self,
+        pcm_value_definitions,
+        mode,
+        read_delay,
+        deadline,
+        ):
+        if self._tracer is None:
+            return self._request_pcm_value_batch(
+                pcm_value_definitions,
+                mode,
+                read_delay,
+                deadline,
+                )
+
+        commands = [definition.command for definition in pcm_value_definitions]
+        span = self._tracer.span("read PCM values", commands=repr(commands))
+        with span as span_args:
+            pcm_values = self._request_pcm_value_batch(
+                pcm_value_definitions,
+                mode,
+                read_delay,
+                deadline,
+                )
+            span_args["result"] = repr(pcm_values)
+        return pcm_values
+
+    def _request_pcm_value_batch(
+        self,
+        pcm_value_definitions,
+        mode,
+        read_delay,
+        deadline,
+        ):
+        hex_words = [mode]
+        for definition in pcm_value_definitions:
+            hex_words.extend(_get_command_identifier(definition.command))
+
+        if self._detect_stn_device():
+            command_data = "STPX D:{}, R:1".format(
+                "".join(_convert_int_to_hex_word(i) for i in hex_words),
+                )
+        else:
+            command_data = _format_hex_words(hex_words)
+        response_raw = self._send_command(command_data, read_delay, deadline)
+
+        negative_response_codes = \
+            _get_negative_response_codes(response_raw, mode)
+        if response_raw == _OBD_RESPONSE_UNSUPPORTED_COMMAND or \
+                _BATCH_REJECTION_RESPONSE_CODES.intersection(
+                    negative_response_codes):
+            # Multi-PID requests aren't supported by the protocol or the ECU
+            self._LOGGER.debug("Batched requests in mode %#04x rejected", mode)
+            self._modes_without_batching.add(mode)
+            pcm_values = {}
+            for definition in pcm_value_definitions:
+                self._read_pcm_value_into(
+                    definition,
+                    pcm_values,
+                    read_delay,
+                    deadline,
+                    )
+            return pcm_values
+
+        identifier_size = \
+            len(_get_command_identifier(pcm_value_definitions[0].command))
+        pcm_values = dict.fromkeys(pcm_value_definitions)
+        payloads = _get_response_payloads(response_raw, mode)
+        for payload in payloads:
+            batch_values = _demultiplex_pcm_values(
+                payload,
+                pcm_value_definitions,
+                header_size=identifier_size,
+                )
+            pcm_values.update(batch_values)
+
+        if payloads and not self._is_protocol_cached:
+            self._cache_detected_protocol()
+
+        return pcm_values
+
+    def _detect_stn_device(self):
+        if self._is_stn_device is None:
+            device_id = self._send_command("STI")
+            self._is_stn_device = device_id.startswith(_STN_DEVICE_ID_PREFIX)
+            self._LOGGER.debug("Device identified as %r", device_id)
+        return self._is_stn_device
+
+    # { Diagnostics
+
+    def read_stored_trouble_codes(self, read_delay=None):
+        return self._read_trouble_codes(_STORED_TROUBLE_CODES_MODE, read_delay)
+
+    def read_pending_trouble_codes(self, read_delay=None):
+        return self._read_trouble_codes(_PENDING_TROUBLE_CODES_MODE, read_delay)
+
+    def read_permanent_trouble_codes(self, read_delay=None):
+        return self._read_trouble_codes(
+            _PERMANENT_TROUBLE_CODES_MODE,
+            read_delay,
+            )
+
+    def _read_trouble_codes(self, mode, read_delay):
+        response_raw = self._send_command(_format_hex_words([mode]), read_delay)
+        if response_raw == _OBD_RESPONSE_UNSUPPORTED_COMMAND:
+            raise ValueNotAvailableError()
+
+        trouble_codes = []
+        for payload in _get_response_payloads(response_raw, mode):
+            for trouble_code in _parse_trouble_codes(payload):
+                if trouble_code not in trouble_codes:
+                    trouble_codes.append(trouble_code)
+        return trouble_codes
+
+    def read_supported_pids(self, mode, read_delay=None):
+        """Return the PIDs supported by the PCM in "mode" (0x01 or 0x02)"""
+        supported_pids = self._supported_pids_by_mode.get(mode)
+        if supported_pids is None:
+            supported_pids = self._query_supported_pids(mode, read_delay)
+            self._supported_pids_by_mode[mode] = supported_pids
+        return supported_pids
+
+    def _query_supported_pids(self, mode, read_delay):
+        supported_pids = set()
+        base_pid = 0x00
+        while True:
+            hex_words = [mode, base_pid]
+            if mode == _FREEZE_FRAME_MODE:
+                hex_words.append(0)
+            response_raw = \
+                self._send_command(_format_hex_words(hex_words), read_delay)
+
+            header_size = len(hex_words) - 1
+            for payload in _get_response_payloads(response_raw, mode):
+                bitmap = payload[header_size:header_size + 4]
+                for word_index, word in enumerate(bitmap):
+                    for bit_index in range(8):
+                        if word & (0x80 >> bit_index):
+                            pid = base_pid + word_index * 8 + bit_index + 1
+                            supported_pids.add(pid)
+
+            base_pid += _SUPPORTED_PIDS_RANGE_SIZE
+            if base_pid not in supported_pids:
+                break
+
+        return supported_pids
+
+    def read_freeze_frame(
+        self,
+        pcm_value_definitions,
+        frame_number=0,
+        max_pids_per_request=_FREEZE_FRAME_MAX_PIDS_PER_REQUEST,
+        read_delay=None,
+        ):
+        """
+        Return the values stored in a freeze frame, by definition.
+
+        Only the values supported by the PCM are read. Several values are read
+        per request if their definitions declare their size in bytes; CAN
+        PCMs accept up to three. Other protocols may need
+        "max_pids_per_request" to be 1.
+
+        """
+        supported_pids = \
+            self.read_supported_pids(_FREEZE_FRAME_MODE, read_delay)
+        pcm_value_definitions = [
+            definition for definition in pcm_value_definitions
+            if definition.command.pid in supported_pids
+            ]
+
+        pcm_values = {}
+        definition_batches = _batch_pcm_value_definitions(
+            pcm_value_definitions,
+            max_pids_per_request,
+            )
+        for definition_batch in definition_batches:
+            hex_words = [_FREEZE_FRAME_MODE]
+            for definition in definition_batch:
+                hex_words.extend((definition.command.pid, frame_number))
+            response_raw = \
+                self._send_command(_format_hex_words(hex_words), read_delay)
+
+            payloads = _get_response_payloads(response_raw, _FREEZE_FRAME_MODE)
+            for payload in payloads:
+                batch_values = _demultiplex_pcm_values(
+                    payload,
+                    definition_batch,
+                    header_size=2,
+                    )
+                pcm_values.update(batch_values)
+
+        return pcm_values
 
 
 def _convert_raw_response_to_words(raw_response):
@@ -97,6 +548,192 @@ def _convert_raw_response_to_words(raw_response):
     return words
 
 
+def _convert_raw_response_to_messages(raw_response):
+    """
+    Split a response into the words of each message in it.
+
+    Responses by several PCMs come in separate lines. The frames in a
+    multi-frame CAN response (the byte count followed by lines with the frame
+    index, like "0: 43 04 01 33 01 34") are joined.
+
+    """
+    messages = []
+    multiframe_message = None
+    multiframe_message_size = None
+    for line in raw_response.splitlines():
+        line = line.strip()
+        frame_index, separator, frame = line.partition(":")
+        try:
+            words = _convert_raw_response_to_words(frame or line)
+        except ValueError:
+            # For example, "SEARCHING..."
+            continue
+
+        if not words:
+            continue
+        elif separator:
+            if multiframe_message is None:
+                multiframe_message = []
+            multiframe_message.extend(words)
+        elif len(words) == 1 and len(line) == 3:
+            multiframe_message_size = words[0]
+            multiframe_message = []
+        else:
+            messages.append(words)
+
+        if multiframe_message is not None and multiframe_message_size and \
+                multiframe_message_size <= len(multiframe_message):
+            messages.append(multiframe_message[:multiframe_message_size])
+            multiframe_message = None
+            multiframe_message_size = None
+
+    if multiframe_message:
+        messages.append(multiframe_message)
+
+    return messages
+
+
+def _get_response_payloads(raw_response, mode):
+    """Return the data in each positive response to a request in a mode"""
+    payloads = []
+    for message in _convert_raw_response_to_messages(raw_response):
+        if message[0] == mode + _OBD_RESPONSE_MODE_OFFSET:
+            payloads.append(message[1:])
+    return payloads
+
+
+def _get_negative_response_codes(raw_response, mode):
+    """
+    Return the codes of the negative responses to a request in a mode.
+
+    "Response pending" codes are left out, since they are followed by the
+    actual response.
+
+    """
+    negative_response_codes = []
+    for message in _convert_raw_response_to_messages(raw_response):
+        if len(message) == 3 and \
+                message[0] == _OBD_NEGATIVE_RESPONSE_ID and \
+                message[1] == mode and \
+                message[2] != _RESPONSE_PENDING_CODE:
+            negative_response_codes.append(message[2])
+    return negative_response_codes
+
+
+def _parse_trouble_codes(payload):
+    # CAN responses start with the number of trouble codes
+    if len(payload) % 2:
+        payload = payload[1:]
+
+    trouble_codes = []
+    for first_byte, second_byte in zip(payload[::2], payload[1::2]):
+        if first_byte or second_byte:
+            trouble_code = _format_trouble_code(first_byte, second_byte)
+            trouble_codes.append(trouble_code)
+    return trouble_codes
+
+
+def _format_trouble_code(first_byte, second_byte):
+    system = _TROUBLE_CODE_SYSTEMS[first_byte >> 6]
+    return "{}{}{:X}{:02X}".format(
+        system,
+        (first_byte >> 4) & 0x03,
+        first_byte & 0x0F,
+        second_byte,
+        )
+
+
+def _batch_pcm_value_definitions(pcm_value_definitions, max_batch_size):
+    """
+    Group the definitions to be read in the same request.
+
+    Definitions whose size isn't declared can only be read on their own
+    because their values can't be told apart in the response.
+
+    """
+    batches = []
+    current_batch = []
+    for definition in pcm_value_definitions:
+        if definition.byte_count is None:
+            batches.append([definition])
+            continue
+
+        current_batch.append(definition)
+        if max_batch_size <= len(current_batch):
+            batches.append(current_batch)
+            current_batch = []
+
+    if current_batch:
+        batches.append(current_batch)
+
+    return batches
+
+
+def _demultiplex_pcm_values(payload, pcm_value_definitions, header_size):
+    """
+    Parse the values in the response to a request for several PIDs.
+
+    Each value is preceded by a header of "header_size" words, starting with
+    the identifier of the value (the PID or the DID).
+
+    """
+    definitions_by_identifier = {
+        _get_command_identifier(definition.command): definition
+        for definition in pcm_value_definitions
+        }
+    identifier_size = len(next(iter(definitions_by_identifier), ()))
+
+    pcm_values = {}
+    position = 0
+    while position < len(payload):
+        identifier = tuple(payload[position:position + identifier_size])
+        definition = definitions_by_identifier.get(identifier)
+        if definition is None:
+            break
+
+        value_start = position + header_size
+        if definition.byte_count is None:
+            value_end = len(payload)
+        else:
+            value_end = value_start + definition.byte_count
+        raw_data = tuple(payload[value_start:value_end])
+
+        pcm_values[definition] = definition.parser(raw_data)
+        position = value_end
+
+    return pcm_values
+
+
+class ProtocolCache(object):
+    """Protocols detected by the device, by vehicle, stored in a JSON file"""
+
+    def __init__(self, file_path):
+        self._file_path = file_path
+        self._protocol_numbers_by_vehicle_id = None
+
+    def get(self, vehicle_id):
+        protocol_numbers_by_vehicle_id = self._load()
+        return protocol_numbers_by_vehicle_id.get(str(vehicle_id))
+
+    def set(self, vehicle_id, protocol_number):
+        protocol_numbers_by_vehicle_id = self._load()
+        protocol_numbers_by_vehicle_id[str(vehicle_id)] = protocol_number
+
+        temporary_file_path = self._file_path + ".tmp"
+        with open(temporary_file_path, "w") as temporary_file:
+            json.dump(protocol_numbers_by_vehicle_id, temporary_file)
+        os.rename(temporary_file_path, self._file_path)
+
+    def _load(self):
+        if self._protocol_numbers_by_vehicle_id is None:
+            try:
+                with open(self._file_path) as cache_file:
+                    self._protocol_numbers_by_vehicle_id = json.load(cache_file)
+            except (IOError, ValueError):
+                self._protocol_numbers_by_vehicle_id = {}
+        return self._protocol_numbers_by_vehicle_id
+
+
 class OBDCommand(object):
 
     def __init__(self, mode, pid):
@@ -125,6 +762,54 @@ class OBDCommand(object):
             )
 
 
+class DataIdentifierCommand(object):
+    """Request for the data with a 16-bit identifier (mode 22)"""
+
+    def __init__(self, data_identifier):
+        self.mode = _DATA_IDENTIFIER_MODE
+        self.data_identifier = data_identifier
+
+    def to_hex_words(self, pretty=False):
+        words = (
+            self.mode,
+            self.data_identifier >> 8,
+            self.data_identifier & 0xFF,
+            )
+        hex_words = tuple(
+            _convert_int_to_hex_word(word, pretty=pretty) for word in words
+            )
+        return hex_words
+
+    def __eq__(self, other):
+        if not isinstance(other, self.__class__):
+            return NotImplemented
+        return self.__dict__ == other.__dict__
+
+    def __hash__(self):
+        return hash((self.mode, self.data_identifier))
+
+    def __repr__(self):
+        return "{}(mode={}, data_identifier={})".format(
+            self.__class__.__name__,
+            _convert_int_to_hex_word(self.mode, pretty=True),
+            _DATA_IDENTIFIER_FORMATTER_PRETTY.format(self.data_identifier),
+            )
+
+
+def _get_command_words(command):
+    return [int(hex_word, 16) for hex_word in command.to_hex_words()]
+
+
+def _get_command_identifier(command):
+    """Return the words that follow the mode in the request of a command"""
+    return tuple(_get_command_words(command)[1:])
+
+
+def _format_hex_words(ints):
+    hex_words = [_convert_int_to_hex_word(i) for i in ints]
+    return " ".join(hex_words)
+
+
 def _convert_int_to_hex_word(i, pretty=False):
     if pretty:
         formatter = _INT_TO_HEX_WORD_FORMATTER_PRETTY
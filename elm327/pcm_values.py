@@ -1,12 +1,15 @@
 # coding: utf-8
+from collections import namedtuple
+
 from elm327.obd import OBDCommand
 
 
 class PCMValueDefinition(object):
 
-    def __init__(self, command, parser):
+    def __init__(self, command, parser, byte_count=None):
         self.command = command
         self.parser = parser
+        self.byte_count = byte_count
 
 
 class PCMValue(object):
@@ -53,6 +56,117 @@ class BitwiseEncodedValueParser(object):
         return PCMValue(value)
 
 
+class BitField(object):
+    """
+    Range of "bit_count" bits in a byte of a response.
+
+    "bit_offset" is counted from the least significant bit of the byte. The
+    value of one-bit fields is a boolean, and that of wider fields is an
+    integer; if an "enumeration" is given, the value is looked up in it.
+
+    """
+
+    def __init__(
+        self,
+        name,
+        byte_index,
+        bit_offset,
+        bit_count=1,
+        enumeration=None,
+        ):
+        if not 0 <= bit_offset or 8 < bit_offset + bit_count:
+            raise ValueError(
+                "Field {!r} does not fit in a byte".format(name),
+                )
+
+        self.name = name
+        self.byte_index = byte_index
+        self.bit_offset = bit_offset
+        self.bit_count = bit_count
+        self.enumeration = enumeration
+
+    def decode(self, byte):
+        raw_value = (byte >> self.bit_offset) & ((1 << self.bit_count) - 1)
+        if self.enumeration is not None:
+            value = self.enumeration.get(raw_value, raw_value)
+        elif self.bit_count == 1:
+            value = bool(raw_value)
+        else:
+            value = raw_value
+        return value
+
+
+class BitfieldParser(object):
+    """
+    Parser of values made up of bit fields.
+
+    The value is a named tuple of the fields, of type "type_name". The fields
+    in each byte are decoded at once with a table precomputed for its 256
+    possible values.
+
+    """
+
+    def __init__(self, bit_fields, type_name="BitFields"):
+        self._value_class = \
+            namedtuple(type_name, [bit_field.name for bit_field in bit_fields])
+
+        bit_fields_by_byte_index = {}
+        for bit_field in bit_fields:
+            bit_fields_by_byte_index \
+                .setdefault(bit_field.byte_index, []) \
+                .append(bit_field)
+
+        self._lookup_tables = []
+        decoded_field_names = []
+        for byte_index in sorted(bit_fields_by_byte_index):
+            byte_bit_fields = bit_fields_by_byte_index[byte_index]
+            lookup_table = [
+                tuple(bit_field.decode(byte) for bit_field in byte_bit_fields)
+                for byte in range(256)
+                ]
+            self._lookup_tables.append((byte_index, lookup_table))
+            decoded_field_names.extend(f.name for f in byte_bit_fields)
+
+        # Positions of the fields in the concatenation of the lookups, in the
+        # order of the definition, if it's not the same
+        field_positions = [
+            decoded_field_names.index(bit_field.name)
+            for bit_field in bit_fields
+            ]
+        if field_positions == sorted(field_positions):
+            self._field_positions = None
+        else:
+            self._field_positions = field_positions
+
+    def __call__(self, response_bytes):
+        decoded_fields = ()
+        for byte_index, lookup_table in self._lookup_tables:
+            decoded_fields += lookup_table[response_bytes[byte_index]]
+        return PCMValue(self._make_value(decoded_fields))
+
+    def parse_batch(self, responses_bytes):
+        """Parse several responses at once, returning their values in order"""
+        decoded_fields_by_response = [()] * len(responses_bytes)
+        for byte_index, lookup_table in self._lookup_tables:
+            decoded_fields_by_response = [
+                decoded_fields + lookup_table[response_bytes[byte_index]]
+                for decoded_fields, response_bytes
+                in zip(decoded_fields_by_response, responses_bytes)
+                ]
+
+        make_value = self._make_value
+        return [
+            PCMValue(make_value(decoded_fields))
+            for decoded_fields in decoded_fields_by_response
+            ]
+
+    def _make_value(self, decoded_fields):
+        if self._field_positions is not None:
+            decoded_fields = \
+                [decoded_fields[position] for position in self._field_positions]
+        return self._value_class._make(decoded_fields)
+
+
 class NumericValueParser(object):
 
     def __init__(self, unit=None, value_scaler=None):
@@ -86,6 +200,7 @@ PERCENTAGE_VALUE_PARSER = NumericValueParser(
 FUEL_LEVEL = PCMValueDefinition(
     OBDCommand(0x01, 0x2F),
     PERCENTAGE_VALUE_PARSER,
+    byte_count=1,
     )
 
 FUEL_TYPE = PCMValueDefinition(
@@ -116,25 +231,117 @@ FUEL_TYPE = PCMValueDefinition(
         21: "Hybrid running electric and combustion engine",
         22: "Hybrid Regenerative",
         23: "Bifuel running diesel",
-        })
+        }),
+    byte_count=1,
     )
 
 ENGINE_FUEL_RATE = PCMValueDefinition(
     OBDCommand(0x01, 0x5E),
     NumericValueParser(unit="L/h", value_scaler=lambda v: v * 0.05),
+    byte_count=2,
     )
 
 VEHICLE_SPEED = PCMValueDefinition(
     OBDCommand(0x01, 0x0D),
     NumericValueParser(unit="km/h"),
+    byte_count=1,
     )
 
 ENGINE_RPM = PCMValueDefinition(
     OBDCommand(0x01, 0x0C),
     NumericValueParser(unit="rpm", value_scaler=lambda v: v / 4),
+    byte_count=2,
     )
 
 ENGINE_COOLANT_TEMPERATURE = PCMValueDefinition(
     OBDCommand(0x01, 0x05),
     NumericValueParser(unit="°C", value_scaler=lambda v: v - 40),
+    byte_count=1,
+    )
+
+_FUEL_SYSTEM_STATUSES = {
+    0x00: "Not present",
+    0x01: "Open loop due to insufficient engine temperature",
+    0x02: "Closed loop",
+    0x04: "Open loop due to engine load or fuel cut due to deceleration",
+    0x08: "Open loop due to system failure",
+    0x10: "Closed loop with a fault in the feedback system",
+    }
+
+# The meaning of the non-continuous monitors (bytes C and D) is that of spark
+# ignition engines; on compression ignition engines ("is_compression_ignition"
+# set), they are catalyst = NMHC catalyst, heated_catalyst = NOx/SCR monitor,
+# secondary_air_system = boost pressure, oxygen_sensor = exhaust gas sensor,
+# oxygen_sensor_heater = PM filter monitoring, and the rest are reserved.
+_MONITOR_BIT_FIELDS = (
+    ("misfire", 1, 0),
+    ("fuel_system", 1, 1),
+    ("components", 1, 2),
+    ("catalyst", 2, 0),
+    ("heated_catalyst", 2, 1),
+    ("evaporative_system", 2, 2),
+    ("secondary_air_system", 2, 3),
+    ("ac_refrigerant", 2, 4),
+    ("oxygen_sensor", 2, 5),
+    ("oxygen_sensor_heater", 2, 6),
+    ("egr_system", 2, 7),
+    )
+
+
+def _make_monitor_bit_fields():
+    """
+    Return the availability and incompleteness fields of the monitors.
+
+    Continuous monitors are available in the low nibble of byte B and
+    incomplete in the high one; non-continuous monitors are available in byte
+    C and incomplete in byte D.
+
+    """
+    bit_fields = []
+    for name, byte_index, bit_offset in _MONITOR_BIT_FIELDS:
+        bit_fields.append(
+            BitField(name + "_available", byte_index, bit_offset),
+            )
+        if byte_index == 1:
+            incomplete_bit_field = \
+                BitField(name + "_incomplete", byte_index, bit_offset + 4)
+        else:
+            incomplete_bit_field = \
+                BitField(name + "_incomplete", byte_index + 1, bit_offset)
+        bit_fields.append(incomplete_bit_field)
+    return bit_fields
+
+
+MONITOR_STATUS = PCMValueDefinition(
+    OBDCommand(0x01, 0x01),
+    BitfieldParser(
+        [
+            BitField("is_mil_on", 0, 7),
+            BitField("trouble_code_count", 0, 0, bit_count=7),
+            BitField("is_compression_ignition", 1, 3),
+            ] + _make_monitor_bit_fields(),
+        type_name="MonitorStatus",
+        ),
+    byte_count=4,
+    )
+
+FUEL_SYSTEM_STATUS = PCMValueDefinition(
+    OBDCommand(0x01, 0x03),
+    BitfieldParser(
+        [
+            BitField("fuel_system_1", 0, 0, 8, _FUEL_SYSTEM_STATUSES),
+            BitField("fuel_system_2", 1, 0, 8, _FUEL_SYSTEM_STATUSES),
+            ],
+        type_name="FuelSystemStatus",
+        ),
+    byte_count=2,
+    )
+
+DRIVE_CYCLE_MONITOR_STATUS = PCMValueDefinition(
+    OBDCommand(0x01, 0x41),
+    BitfieldParser(
+        _make_monitor_bit_fields(),
+        type_name="DriveCycleMonitorStatus",
+        ),
+    byte_count=4,
     )
@@ -0,0 +1,179 @@
+################################################################################
+# The MIT License (MIT)
+#
+# Copyright (c) 2014 Francisco Ruiz
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+################################################################################
+
+from collections import deque
+from logging import getLogger
+import math
+import time
+
+from elm327.connection import RequestTimeoutError
+from elm327.obd import ValueNotAvailableError
+
+
+_DEFAULT_LATENCY_WINDOW_SIZE = 100
+
+_DEFAULT_TIMED_OUT_RETRY_PERIOD = 10
+
+_SKIPPING_PERCENTILE = 99
+
+
+class LatencyTracker(object):
+    """Latencies of the most recent requests, by key"""
+
+    def __init__(self, window_size=_DEFAULT_LATENCY_WINDOW_SIZE):
+        self._window_size = window_size
+        self._latencies_by_key = {}
+
+    def add(self, key, latency):
+        latencies = self._latencies_by_key.get(key)
+        if latencies is None:
+            latencies = deque(maxlen=self._window_size)
+            self._latencies_by_key[key] = latencies
+        latencies.append(latency)
+
+    def get_percentile(self, percentile, key=None):
+        """
+        Return the given percentile of the latencies of "key", or of all the
+        keys if it's None. None is returned if there are no latencies yet.
+
+        """
+        if key is None:
+            latencies = []
+            for key_latencies in self._latencies_by_key.values():
+                latencies.extend(key_latencies)
+        else:
+            latencies = self._latencies_by_key.get(key, ())
+
+        if not latencies:
+            return None
+
+        sorted_latencies = sorted(latencies)
+        rank = int(math.ceil(percentile / 100.0 * len(sorted_latencies)))
+        return sorted_latencies[max(rank, 1) - 1]
+
+
+class Poller(object):
+    """
+    Reader of a set of PCM values in cycles of a fixed duration.
+
+    No request is allowed to last beyond the end of its cycle, and none is
+    sent once the cycle is over. Values whose recent 99th percentile latency
+    doesn't fit in the time left in a cycle are skipped. They're read first
+    in the next cycle, regardless of their latency, so that they aren't
+    starved.
+
+    Values whose requests time out are demoted: They're only read every
+    "timed_out_retry_period" cycles, last and regardless of their latency,
+    until they're answered again.
+
+    """
+
+    _LOGGER = getLogger(__name__ + "Poller")
+
+    def __init__(
+        self,
+        interface,
+        pcm_value_definitions,
+        cycle_duration,
+        latency_window_size=_DEFAULT_LATENCY_WINDOW_SIZE,
+        timed_out_retry_period=_DEFAULT_TIMED_OUT_RETRY_PERIOD,
+        ):
+        self._interface = interface
+        self._pcm_value_definitions = list(pcm_value_definitions)
+        self._cycle_duration = cycle_duration
+        self._timed_out_retry_period = timed_out_retry_period
+
+        self.latency_tracker = LatencyTracker(latency_window_size)
+        self.skipped_definitions = []
+        self._cycles_until_retry_by_definition = {}
+
+    def poll(self):
+        """Read the values in a cycle and return those read, by definition"""
+        cycle_deadline = time.time() + self._cycle_duration
+
+        skipped_definitions = []
+        pcm_values = {}
+        for definition in self._get_cycle_definitions():
+            is_demoted = definition in self._cycles_until_retry_by_definition
+            request_start_time = time.time()
+            if cycle_deadline <= request_start_time:
+                if not is_demoted:
+                    skipped_definitions.append(definition)
+                continue
+
+            expected_latency = self.latency_tracker.get_percentile(
+                _SKIPPING_PERCENTILE,
+                definition,
+                )
+            is_too_slow = \
+                cycle_deadline < request_start_time + (expected_latency or 0)
+            is_exempt = is_demoted or definition in self.skipped_definitions
+            if is_too_slow and not is_exempt:
+                skipped_definitions.append(definition)
+                continue
+
+            try:
+                pcm_value = self._interface.read_pcm_value(
+                    definition,
+                    deadline=cycle_deadline,
+                    )
+            except RequestTimeoutError:
+                self._LOGGER.debug("Request for %r timed out", definition)
+                self._cycles_until_retry_by_definition[definition] = \
+                    self._timed_out_retry_period - 1
+                continue
+            except ValueNotAvailableError:
+                self._LOGGER.debug("Value %r is not available", definition)
+            else:
+                pcm_values[definition] = pcm_value
+            finally:
+                latency = time.time() - request_start_time
+                self.latency_tracker.add(definition, latency)
+
+            self._cycles_until_retry_by_definition.pop(definition, None)
+
+        self.skipped_definitions = skipped_definitions
+        return pcm_values
+
+    def get_latency_percentile(self, percentile=99, definition=None):
+        return self.latency_tracker.get_percentile(percentile, definition)
+
+    def _get_cycle_definitions(self):
+        cycle_definitions = list(self.skipped_definitions)
+        retried_definitions = []
+        for definition in self._pcm_value_definitions:
+            if definition in cycle_definitions:
+                continue
+
+            cycles_until_retry = \
+                self._cycles_until_retry_by_definition.get(definition)
+            if cycles_until_retry is None:
+                cycle_definitions.append(definition)
+            elif cycles_until_retry:
+                self._cycles_until_retry_by_definition[definition] = \
+                    cycles_until_retry - 1
+            else:
+                retried_definitions.append(definition)
+
+        return cycle_definitions + retried_definitions
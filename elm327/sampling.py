@@ -0,0 +1,240 @@
+################################################################################
+# The MIT License (MIT)
+#
+# Copyright (c) 2014 Francisco Ruiz
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+################################################################################
+
+from logging import getLogger
+from numbers import Real
+import time
+
+from elm327.obd import ValueNotAvailableError
+from elm327.pcm_values import ENGINE_RPM
+from elm327.pcm_values import VEHICLE_SPEED
+
+
+_DEFAULT_ENGINE_OFF_BACKOFF = 10
+
+_DEFAULT_RATE_SMOOTHING = 0.5
+
+_ENGINE_STATE_DEFINITIONS = (ENGINE_RPM, VEHICLE_SPEED)
+
+
+class SamplingBounds(object):
+    """
+    Sampling configuration of a channel.
+
+    The channel is read often enough to catch changes of
+    "significant_change", but never more often than every "min_interval"
+    seconds nor less often than every "max_interval" seconds.
+
+    """
+
+    def __init__(self, min_interval, max_interval, significant_change):
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.significant_change = significant_change
+
+
+class AdaptiveSampler(object):
+    """
+    Reader of PCM values at intervals adapted to how fast they change.
+
+    The rate of change of each channel is estimated from its recent samples,
+    and its interval is the time it would take to change significantly,
+    within its :class:`SamplingBounds`. Any change of a non-numeric value is
+    deemed significant. When the engine is off (the engine
+    RPM and the vehicle speed are both 0), the intervals of the other
+    channels are multiplied by "engine_off_backoff"; those two keep theirs
+    so that the engine starting is noticed promptly.
+
+    If "max_requests_per_second" is given, the channels that are due are read
+    in order of urgency within that budget, so the bandwidth freed by flat
+    channels goes to those that are changing.
+
+    """
+
+    _LOGGER = getLogger(__name__ + "AdaptiveSampler")
+
+    def __init__(
+        self,
+        interface,
+        sampling_bounds_by_definition,
+        engine_off_backoff=_DEFAULT_ENGINE_OFF_BACKOFF,
+        max_requests_per_second=None,
+        rate_smoothing=_DEFAULT_RATE_SMOOTHING,
+        ):
+        self._interface = interface
+        self._engine_off_backoff = engine_off_backoff
+        self._max_requests_per_second = max_requests_per_second
+        self._rate_smoothing = rate_smoothing
+
+        self._channel_states_by_definition = {
+            definition: _ChannelState(sampling_bounds)
+            for definition, sampling_bounds
+            in sampling_bounds_by_definition.items()
+            }
+
+        self._request_budget = max_requests_per_second
+        self._last_poll_time = None
+
+    @property
+    def is_engine_off(self):
+        engine_values = []
+        for definition in _ENGINE_STATE_DEFINITIONS:
+            channel_state = self._channel_states_by_definition.get(definition)
+            if channel_state is None or channel_state.last_value is None:
+                return False
+            engine_values.append(channel_state.last_value)
+        return not any(engine_values)
+
+    def get_interval(self, pcm_value_definition):
+        channel_state = self._channel_states_by_definition[pcm_value_definition]
+        interval = channel_state.interval
+        if pcm_value_definition not in _ENGINE_STATE_DEFINITIONS and \
+                self.is_engine_off:
+            interval *= self._engine_off_backoff
+        return interval
+
+    def poll(self, now=None):
+        """Read the channels that are due and return their values"""
+        if now is None:
+            now = time.time()
+
+        due_definitions = [
+            definition
+            for definition, channel_state
+            in self._channel_states_by_definition.items()
+            if self._get_next_sample_time(definition, channel_state) <= now
+            ]
+        due_definitions.sort(
+            key=lambda definition: self._get_urgency(definition, now),
+            reverse=True,
+            )
+
+        request_count = self._get_request_allowance(now, len(due_definitions))
+
+        pcm_values = {}
+        for definition in due_definitions[:request_count]:
+            try:
+                pcm_value = self._interface.read_pcm_value(definition)
+            except ValueNotAvailableError:
+                self._LOGGER.debug("Value %r is not available", definition)
+                del self._channel_states_by_definition[definition]
+                continue
+
+            pcm_values[definition] = pcm_value
+            channel_state = self._channel_states_by_definition[definition]
+            channel_state.add_sample(pcm_value, now, self._rate_smoothing)
+
+        return pcm_values
+
+    def _get_next_sample_time(self, definition, channel_state):
+        if channel_state.last_sample_time is None:
+            return float("-inf")
+        return channel_state.last_sample_time + self.get_interval(definition)
+
+    def _get_urgency(self, definition, now):
+        channel_state = self._channel_states_by_definition[definition]
+        if channel_state.last_sample_time is None:
+            return float("inf")
+
+        elapsed_time = now - channel_state.last_sample_time
+        return elapsed_time / self.get_interval(definition)
+
+    def _get_request_allowance(self, now, due_count):
+        if self._max_requests_per_second is None:
+            return due_count
+
+        if self._last_poll_time is not None:
+            elapsed_time = now - self._last_poll_time
+            self._request_budget = min(
+                self._request_budget +
+                elapsed_time * self._max_requests_per_second,
+                self._max_requests_per_second,
+                )
+        self._last_poll_time = now
+
+        request_count = min(int(self._request_budget), due_count)
+        self._request_budget -= request_count
+        return request_count
+
+
+class _ChannelState(object):
+
+    def __init__(self, sampling_bounds):
+        self._sampling_bounds = sampling_bounds
+
+        self.last_value = None
+        self.last_sample_time = None
+        self.rate_of_change = None
+        self.interval = sampling_bounds.min_interval
+
+    def add_sample(self, pcm_value, sample_time, rate_smoothing):
+        value = None if pcm_value is None else pcm_value.value
+
+        if self.last_sample_time is not None and value is not None and \
+                self.last_value is not None:
+            elapsed_time = sample_time - self.last_sample_time
+            rate_of_change = _estimate_rate_of_change(
+                self.last_value,
+                value,
+                elapsed_time,
+                self._sampling_bounds.significant_change,
+                )
+            if self.rate_of_change is None:
+                self.rate_of_change = rate_of_change
+            else:
+                self.rate_of_change = \
+                    rate_smoothing * rate_of_change + \
+                    (1 - rate_smoothing) * self.rate_of_change
+            self.interval = self._calculate_interval()
+
+        self.last_value = value
+        self.last_sample_time = sample_time
+
+    def _calculate_interval(self):
+        sampling_bounds = self._sampling_bounds
+        if self.rate_of_change:
+            interval = sampling_bounds.significant_change / self.rate_of_change
+        else:
+            interval = sampling_bounds.max_interval
+        interval = max(interval, sampling_bounds.min_interval)
+        interval = min(interval, sampling_bounds.max_interval)
+        return interval
+
+
+def _estimate_rate_of_change(
+    previous_value,
+    value,
+    elapsed_time,
+    significant_change,
+    ):
+    if elapsed_time <= 0:
+        return 0
+
+    if not (isinstance(value, Real) and isinstance(previous_value, Real)):
+        # Non-numeric values either change or not
+        if value == previous_value:
+            return 0
+        return significant_change / float(elapsed_time)
+
+    return abs(value - previous_value) / float(elapsed_time)
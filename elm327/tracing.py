@@ -0,0 +1,136 @@
+################################################################################
+# The MIT License (MIT)
+#
+# Copyright (c) 2014 Francisco Ruiz
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+################################################################################
+
+from collections import deque
+from threading import current_thread
+import json
+import os
+import time
+
+
+_DEFAULT_CAPACITY = 10000
+
+_MICROSECONDS_PER_SECOND = 1000000
+
+_COMPLETE_EVENT_PHASE = "X"
+
+_INSTANT_EVENT_PHASE = "i"
+
+
+class Tracer(object):
+    """
+    Recorder of the timeline of the communication with the device.
+
+    Spans and instant events are kept in a ring buffer of "capacity" events,
+    so only the most recent ones are kept. They can be exported in the
+    Chrome trace format, which can be loaded in chrome://tracing or Perfetto.
+
+    """
+
+    def __init__(self, capacity=_DEFAULT_CAPACITY):
+        self._events = deque(maxlen=capacity)
+
+    def add_span(self, name, start_time, end_time, **args):
+        event = (
+            _COMPLETE_EVENT_PHASE,
+            name,
+            start_time,
+            end_time - start_time,
+            current_thread().ident,
+            args,
+            )
+        self._events.append(event)
+
+    def add_instant_event(self, name, event_time, **args):
+        event = (
+            _INSTANT_EVENT_PHASE,
+            name,
+            event_time,
+            0,
+            current_thread().ident,
+            args,
+            )
+        self._events.append(event)
+
+    def span(self, name, **args):
+        """
+        Return a context manager that records a span around its block.
+
+        The arguments of the span can be updated inside the block, for example
+        to add its result.
+
+        """
+        return _Span(self, name, args)
+
+    def clear(self):
+        self._events.clear()
+
+    def export_chrome_trace(self, trace_file):
+        """Write the events recorded to "trace_file" in Chrome trace format"""
+        process_id = os.getpid()
+        trace_events = []
+        for phase, name, start_time, duration, thread_id, args in self._events:
+            trace_event = {
+                "name": name,
+                "ph": phase,
+                "ts": start_time * _MICROSECONDS_PER_SECOND,
+                "pid": process_id,
+                "tid": thread_id,
+                "args": args,
+                }
+            if phase == _COMPLETE_EVENT_PHASE:
+                trace_event["dur"] = duration * _MICROSECONDS_PER_SECOND
+            else:
+                trace_event["s"] = "t"
+            trace_events.append(trace_event)
+
+        json.dump(
+            {"traceEvents": trace_events, "displayTimeUnit": "ms"},
+            trace_file,
+            )
+
+
+class _Span(object):
+
+    def __init__(self, tracer, name, args):
+        self._tracer = tracer
+        self._name = name
+        self.args = args
+
+        self._start_time = None
+
+    def __enter__(self):
+        self._start_time = time.time()
+        return self.args
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is not None:
+            self.args["error"] = repr(exc_value)
+
+        self._tracer.add_span(
+            self._name,
+            self._start_time,
+            time.time(),
+            **self.args
+            )
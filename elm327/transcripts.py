@@ -0,0 +1,501 @@
+################################################################################
+# The MIT License (MIT)
+#
+# Copyright (c) 2014 Francisco Ruiz
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+################################################################################
+"""
+Decoder of ELM327 session transcripts.
+
+A transcript is the raw text exchanged with the device with echo enabled:
+each command is followed by its response and the prompt (">"). The values
+in the responses to the commands of the definitions in
+:mod:`elm327.pcm_values` are decoded, in parallel, into CSV or a binary
+columnar format.
+
+Usage: python -m elm327.transcripts TRANSCRIPT... [--csv PATH]
+    [--columnar PATH] [--processes N]
+
+"""
+
+from array import array
+from argparse import ArgumentParser
+from logging import getLogger
+from multiprocessing import Pool
+from numbers import Real
+from struct import Struct
+import csv
+import sys
+import time
+
+from elm327 import pcm_values
+from elm327.obd import ELMError
+from elm327.obd import OBDInterface
+from elm327.obd import _OBD_RESPONSE_UNSUPPORTED_COMMAND
+from elm327.obd import _demultiplex_pcm_values
+from elm327.obd import _get_command_identifier
+from elm327.obd import _get_command_words
+from elm327.obd import _get_negative_response_codes
+from elm327.obd import _get_response_payloads
+from elm327.pcm_values import PCMValueDefinition
+
+
+_DEFAULT_CHUNK_SIZE = 1024 * 1024
+
+_BYTES_PER_MEGABYTE = 1024.0 * 1024.0
+
+_COLUMNAR_FORMAT_MAGIC = b"ELMC\x01"
+
+_UINT32 = Struct("<I")
+
+_CSV_HEADER = ("index", "name", "value", "unit")
+
+_CONFIGURATION_COMMAND_PREFIXES = ("AT", "ST")
+
+_STPX_COMMAND_PREFIX = "STPX"
+
+_LOGGER = getLogger(__name__)
+
+
+class DecodingStatistics(object):
+
+    def __init__(self, byte_count, row_count, skipped_line_count, duration):
+        self.byte_count = byte_count
+        self.row_count = row_count
+        self.skipped_line_count = skipped_line_count
+        self.duration = duration
+
+    @property
+    def throughput(self):
+        """Megabytes of transcript decoded per second"""
+        if not self.duration:
+            return None
+        return self.byte_count / _BYTES_PER_MEGABYTE / self.duration
+
+
+def decode_transcript(transcript, definitions_by_name=None):
+    """
+    Return the (name, value, unit) of each value in "transcript".
+
+    The definitions default to those in :mod:`elm327.pcm_values`, by name.
+    Requests for several values, including STN "STPX" requests, are decoded
+    like :class:`~elm327.obd.OBDInterface` does. Non-numeric values are
+    decoded into their text. Unknown commands and responses without a value
+    are ignored.
+
+    """
+    rows, _ = _decode_transcript_chunk(transcript, definitions_by_name)
+    return rows
+
+
+def decode_transcript_files(
+    transcript_paths,
+    csv_path=None,
+    columnar_path=None,
+    processes=None,
+    chunk_size=_DEFAULT_CHUNK_SIZE,
+    ):
+    """
+    Decode the transcripts in chunks across a pool of "processes".
+
+    The rows are numbered in the order of the transcripts. Return the
+    :class:`DecodingStatistics`.
+
+    """
+    start_time = time.time()
+
+    columnar_writer = _ColumnarWriter() if columnar_path else None
+    csv_file = open(csv_path, "wb") if csv_path else None
+    csv_writer = csv.writer(csv_file) if csv_file else None
+    if csv_writer:
+        csv_writer.writerow(_CSV_HEADER)
+
+    byte_counter = _ByteCounter()
+    chunks = _iter_transcript_files_chunks(transcript_paths, chunk_size)
+    chunks = byte_counter.count(chunks)
+
+    pool = Pool(processes) if processes != 1 else None
+    try:
+        if pool:
+            chunk_results = pool.imap(_decode_transcript_chunk, chunks)
+        else:
+            chunk_results = (
+                _decode_transcript_chunk(chunk) for chunk in chunks
+                )
+
+        row_count = 0
+        skipped_line_count = 0
+        for rows, chunk_skipped_line_count in chunk_results:
+            skipped_line_count += chunk_skipped_line_count
+            for name, value, unit in rows:
+                if csv_writer:
+                    csv_writer.writerow((row_count, name, value, unit))
+                if columnar_writer:
+                    columnar_writer.add_row(row_count, name, value, unit)
+                row_count += 1
+    finally:
+        if pool:
+            pool.terminate()
+        if csv_file:
+            csv_file.close()
+
+    if columnar_writer:
+        with open(columnar_path, "wb") as columnar_file:
+            columnar_writer.write(columnar_file)
+
+    duration = time.time() - start_time
+    return DecodingStatistics(
+        byte_counter.byte_count,
+        row_count,
+        skipped_line_count,
+        duration,
+        )
+
+
+def read_columnar_file(columnar_file):
+    """
+    Return the columns in a file written by :func:`decode_transcript_files`.
+
+    The columns are "index", "name", "value", "text" and "unit"; "value" is
+    NaN for non-numeric values, whose text is in "text".
+
+    """
+    magic = columnar_file.read(len(_COLUMNAR_FORMAT_MAGIC))
+    if magic != _COLUMNAR_FORMAT_MAGIC:
+        raise ValueError("Not a columnar transcript file")
+
+    row_count = _read_uint32(columnar_file)
+    indices = _read_array(columnar_file, "I", row_count)
+    values = _read_array(columnar_file, "d", row_count)
+    columns = {"index": list(indices), "value": list(values)}
+    for column_name in _ColumnarWriter.DICTIONARY_COLUMN_NAMES:
+        strings = [
+            columnar_file.read(_read_uint32(columnar_file))
+            for _ in range(_read_uint32(columnar_file))
+            ]
+        codes = _read_array(columnar_file, "I", row_count)
+        columns[column_name] = [strings[code] for code in codes]
+    return columns
+
+
+def main(argv=None):
+    argument_parser = ArgumentParser(description="Decode ELM327 transcripts")
+    argument_parser.add_argument("transcript_paths", nargs="+")
+    argument_parser.add_argument("--csv", dest="csv_path")
+    argument_parser.add_argument("--columnar", dest="columnar_path")
+    argument_parser.add_argument("--processes", type=int)
+    arguments = argument_parser.parse_args(argv)
+
+    if not (arguments.csv_path or arguments.columnar_path):
+        argument_parser.error("At least an output path is required")
+
+    statistics = decode_transcript_files(
+        arguments.transcript_paths,
+        arguments.csv_path,
+        arguments.columnar_path,
+        arguments.processes,
+        )
+
+    sys.stderr.write(
+        "Decoded {} values ({} lines skipped) from {:.1f} MB in {:.2f} s "
+        "({:.1f} MB/s)\n".format(
+            statistics.row_count,
+            statistics.skipped_line_count,
+            statistics.byte_count / _BYTES_PER_MEGABYTE,
+            statistics.duration,
+            statistics.throughput or 0,
+            )
+        )
+
+
+def _decode_transcript_chunk(transcript, definitions_by_name=None):
+    """
+    Return the rows decoded from "transcript" and the number of its request
+    lines that were skipped, either because the values requested are unknown
+    or because the response is invalid.
+
+    """
+    if definitions_by_name is None:
+        definitions_by_name = _get_definitions_by_name()
+    named_definitions_by_identifier_by_mode = \
+        _get_named_definitions_by_identifier_by_mode(definitions_by_name)
+
+    rows = []
+    skipped_line_count = 0
+    for exchange in transcript.split(">"):
+        lines = exchange.replace("\n", "\r").split("\r")
+        lines = [line.strip() for line in lines if line.strip()]
+        if len(lines) < 2 or _is_configuration_command(lines[0]):
+            continue
+
+        mode, named_definitions = _parse_command(
+            lines[0],
+            named_definitions_by_identifier_by_mode,
+            )
+        if not named_definitions:
+            _LOGGER.debug("Ignoring unknown command %r", lines[0])
+            skipped_line_count += 1
+            continue
+
+        response = "\r".join(lines[1:])
+        try:
+            named_pcm_values = \
+                _decode_response(response, mode, named_definitions)
+        except (ELMError, ValueError, IndexError, KeyError):
+            _LOGGER.debug("Ignoring invalid response %r", response)
+            skipped_line_count += 1
+            continue
+
+        for definition_name, pcm_value in named_pcm_values:
+            rows.append((definition_name, pcm_value.value, pcm_value.unit))
+
+    return rows, skipped_line_count
+
+
+def _get_definitions_by_name():
+    definitions_by_name = {}
+    for name in dir(pcm_values):
+        attribute = getattr(pcm_values, name)
+        if isinstance(attribute, PCMValueDefinition):
+            definitions_by_name[name] = attribute
+    return definitions_by_name
+
+
+def _get_named_definitions_by_identifier_by_mode(definitions_by_name):
+    named_definitions_by_identifier_by_mode = {}
+    for name, definition in definitions_by_name.items():
+        mode = _get_command_words(definition.command)[0]
+        identifier = _get_command_identifier(definition.command)
+        named_definitions_by_identifier = \
+            named_definitions_by_identifier_by_mode.setdefault(mode, {})
+        named_definitions_by_identifier[identifier] = (name, definition)
+    return named_definitions_by_identifier_by_mode
+
+
+def _is_configuration_command(command_line):
+    command_line = command_line.upper()
+    return command_line.startswith(_CONFIGURATION_COMMAND_PREFIXES) and \
+        not command_line.startswith(_STPX_COMMAND_PREFIX)
+
+
+def _parse_command(command_line, named_definitions_by_identifier_by_mode):
+    """
+    Return the mode of the request in "command_line" and the (name,
+    definition) of each value requested in it, in order.
+
+    """
+    words = _parse_request_words(command_line)
+    if not words:
+        return None, []
+
+    mode = words[0]
+    named_definitions_by_identifier = \
+        named_definitions_by_identifier_by_mode.get(mode, {})
+    identifier_size = len(next(iter(named_definitions_by_identifier), ()))
+    identifier_words = words[1:]
+    if not identifier_size or len(identifier_words) % identifier_size:
+        return mode, []
+
+    named_definitions = []
+    for position in range(0, len(identifier_words), identifier_size):
+        identifier = \
+            tuple(identifier_words[position:position + identifier_size])
+        named_definition = named_definitions_by_identifier.get(identifier)
+        if named_definition is not None:
+            named_definitions.append(named_definition)
+    return mode, named_definitions
+
+
+def _parse_request_words(command_line):
+    if command_line.upper().startswith(_STPX_COMMAND_PREFIX):
+        hex_data = _get_stpx_request_data(command_line)
+    else:
+        hex_data = command_line.replace(" ", "")
+
+    if len(hex_data) % 2:
+        return None
+
+    try:
+        words = [
+            int(hex_data[position:position + 2], 16)
+            for position in range(0, len(hex_data), 2)
+            ]
+    except ValueError:
+        return None
+    return words
+
+
+def _get_stpx_request_data(command_line):
+    """Return the data of an "STPX D:010C0D, R:1" request"""
+    parameters = command_line[len(_STPX_COMMAND_PREFIX):].split(",")
+    for parameter in parameters:
+        name, _, value = parameter.partition(":")
+        if name.strip().upper() == "D":
+            return value.replace(" ", "")
+    return ""
+
+
+def _decode_response(response, mode, named_definitions):
+    """Return the (name, value) of each value in the response to a request"""
+    if len(named_definitions) == 1:
+        definition_name, definition = named_definitions[0]
+        pcm_value = OBDInterface._make_pcm_value(response, definition)
+        if pcm_value is None:
+            return []
+        return [(definition_name, pcm_value)]
+
+    if response == _OBD_RESPONSE_UNSUPPORTED_COMMAND or \
+            _get_negative_response_codes(response, mode):
+        raise ELMError("Unexpected response {!r}".format(response))
+
+    definitions = [definition for _, definition in named_definitions]
+    identifier_size = len(_get_command_identifier(definitions[0].command))
+    pcm_values_by_definition = {}
+    for payload in _get_response_payloads(response, mode):
+        batch_values = _demultiplex_pcm_values(
+            payload,
+            definitions,
+            header_size=identifier_size,
+            )
+        pcm_values_by_definition.update(batch_values)
+
+    named_pcm_values = []
+    for definition_name, definition in named_definitions:
+        pcm_value = pcm_values_by_definition.get(definition)
+        if pcm_value is not None:
+            named_pcm_values.append((definition_name, pcm_value))
+    return named_pcm_values
+
+
+def _iter_transcript_files_chunks(transcript_paths, chunk_size):
+    for transcript_path in transcript_paths:
+        with open(transcript_path, "rb") as transcript_file:
+            for chunk in _iter_transcript_chunks(transcript_file, chunk_size):
+                yield chunk
+
+
+def _iter_transcript_chunks(transcript_file, chunk_size):
+    """Yield chunks of about "chunk_size" bytes that end with a prompt"""
+    pending_data = ""
+    while True:
+        data = transcript_file.read(chunk_size)
+        if not data:
+            break
+
+        data = pending_data + data
+        chunk_end = data.rfind(">") + 1
+        pending_data = data[chunk_end:]
+        if chunk_end:
+            yield data[:chunk_end]
+
+    if pending_data:
+        yield pending_data
+
+
+class _ByteCounter(object):
+
+    def __init__(self):
+        self.byte_count = 0
+
+    def count(self, chunks):
+        for chunk in chunks:
+            self.byte_count += len(chunk)
+            yield chunk
+
+
+class _ColumnarWriter(object):
+
+    DICTIONARY_COLUMN_NAMES = ("name", "text", "unit")
+
+    def __init__(self):
+        self._indices = array("I")
+        self._values = array("d")
+        self._dictionary_columns = [
+            _DictionaryColumn() for _ in self.DICTIONARY_COLUMN_NAMES
+            ]
+
+    def add_row(self, index, name, value, unit):
+        self._indices.append(index)
+        if isinstance(value, Real):
+            self._values.append(value)
+            text = ""
+        else:
+            self._values.append(float("nan"))
+            text = str(value)
+
+        for column, column_value in zip(
+                self._dictionary_columns,
+                (name, text, unit or ""),
+                ):
+            column.append(column_value)
+
+    def write(self, columnar_file):
+        columnar_file.write(_COLUMNAR_FORMAT_MAGIC)
+        columnar_file.write(_UINT32.pack(len(self._indices)))
+        _write_array(columnar_file, self._indices)
+        _write_array(columnar_file, self._values)
+        for column in self._dictionary_columns:
+            column.write(columnar_file)
+
+
+class _DictionaryColumn(object):
+
+    def __init__(self):
+        self._strings = []
+        self._codes_by_string = {}
+        self._codes = array("I")
+
+    def append(self, string):
+        code = self._codes_by_string.get(string)
+        if code is None:
+            code = len(self._strings)
+            self._strings.append(string)
+            self._codes_by_string[string] = code
+        self._codes.append(code)
+
+    def write(self, columnar_file):
+        columnar_file.write(_UINT32.pack(len(self._strings)))
+        for string in self._strings:
+            columnar_file.write(_UINT32.pack(len(string)))
+            columnar_file.write(string)
+        _write_array(columnar_file, self._codes)
+
+
+def _write_array(output_file, values):
+    if sys.byteorder == "big":
+        values = array(values.typecode, values)
+        values.byteswap()
+    values.tofile(output_file)
+
+
+def _read_array(input_file, typecode, length):
+    values = array(typecode)
+    values.fromfile(input_file, length)
+    if sys.byteorder == "big":
+        values.byteswap()
+    return values
+
+
+def _read_uint32(input_file):
+    return _UINT32.unpack(input_file.read(_UINT32.size))[0]
+
+
+if __name__ == "__main__":
+    main()
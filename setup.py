@@ -55,5 +55,10 @@ setup(
     install_requires=[
         "pyserial>=2.7",
         ],
+    entry_points={
+        "console_scripts": [
+            "elm327-decode-transcripts = elm327.transcripts:main",
+            ],
+        },
     test_suite="nose.collector",
     )
@@ -0,0 +1,259 @@
+# coding: utf-8
+################################################################################
+# The MIT License (MIT)
+#
+# Copyright (c) 2014 Francisco Ruiz
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+################################################################################
+
+from multiprocessing import Process
+from tempfile import mkdtemp
+import os
+import shutil
+
+from nose.tools import assert_is_none
+from nose.tools import assert_raises
+from nose.tools import eq_
+
+from elm327.board import BoardError
+from elm327.board import BoardPublisher
+from elm327.board import BoardReader
+from elm327.connection import RequestTimeoutError
+from elm327.obd import ELMError
+from elm327.obd import OBDCommand
+from elm327.obd import ValueNotAvailableError
+from elm327.pcm_values import ENGINE_COOLANT_TEMPERATURE
+from elm327.pcm_values import ENGINE_RPM
+from elm327.pcm_values import FUEL_TYPE
+from elm327.pcm_values import MONITOR_STATUS
+from elm327.pcm_values import NumericValueParser
+from elm327.pcm_values import PCMValue
+from elm327.pcm_values import PCMValueDefinition
+from elm327.pcm_values import VEHICLE_SPEED
+
+
+_UNPUBLISHED_DEFINITION = \
+    PCMValueDefinition(OBDCommand(0x01, 0x2F), NumericValueParser())
+
+_UNKNOWN_UNIT_DEFINITION = \
+    PCMValueDefinition(OBDCommand(0x01, 0x10), NumericValueParser("g/min"))
+
+_HEADER_SIZE = 12
+
+
+class TestBoard(object):
+
+    def setup(self):
+        self._directory_path = mkdtemp()
+        self._board_file_path = os.path.join(self._directory_path, "board")
+
+    def teardown(self):
+        shutil.rmtree(self._directory_path)
+
+    def test_publishing(self):
+        interface = _FakeInterface({
+            ENGINE_RPM: PCMValue(800.5, "rpm"),
+            VEHICLE_SPEED: PCMValue(50, "km/h"),
+            ENGINE_COOLANT_TEMPERATURE: PCMValue(90, "°C"),
+            _UNPUBLISHED_DEFINITION: ValueNotAvailableError(),
+            })
+        publisher = BoardPublisher(
+            interface,
+            [
+                ENGINE_RPM,
+                VEHICLE_SPEED,
+                ENGINE_COOLANT_TEMPERATURE,
+                _UNPUBLISHED_DEFINITION,
+                ],
+            self._board_file_path,
+            )
+        reader = BoardReader(self._board_file_path)
+        assert_is_none(reader.read(ENGINE_RPM))
+
+        pcm_values = publisher.publish_once(now=10)
+
+        eq_(3, len(pcm_values))
+        eq_((PCMValue(800.5, "rpm"), 10), reader.read(ENGINE_RPM))
+        eq_((PCMValue(50, "km/h"), 10), reader.read(VEHICLE_SPEED))
+        eq_(
+            (PCMValue(90, "°C"), 10),
+            reader.read(ENGINE_COOLANT_TEMPERATURE),
+            )
+        assert_is_none(reader.read(_UNPUBLISHED_DEFINITION))
+
+        publisher.publish(ENGINE_RPM, PCMValue(900, "rpm"), 11)
+        eq_((PCMValue(900, "rpm"), 11), reader.read(ENGINE_RPM))
+
+        reader.close()
+        publisher.close()
+
+    def test_values_not_on_board(self):
+        publisher = BoardPublisher(
+            _FakeInterface({}),
+            [ENGINE_RPM],
+            self._board_file_path,
+            )
+        reader = BoardReader(self._board_file_path)
+
+        with assert_raises(KeyError):
+            reader.read(VEHICLE_SPEED)
+
+        reader.close()
+        publisher.close()
+
+    def test_non_numeric_values(self):
+        for definition in (FUEL_TYPE, MONITOR_STATUS, _UNKNOWN_UNIT_DEFINITION):
+            with assert_raises(BoardError):
+                BoardPublisher(
+                    _FakeInterface({}),
+                    [definition],
+                    self._board_file_path,
+                    )
+
+        publisher = BoardPublisher(
+            _FakeInterface({}),
+            [ENGINE_RPM],
+            self._board_file_path,
+            )
+        with assert_raises(BoardError):
+            publisher.publish(ENGINE_RPM, PCMValue("Diesel"), 10)
+        with assert_raises(BoardError):
+            publisher.publish(ENGINE_RPM, PCMValue(1, "furlong"), 10)
+
+        publisher.close()
+
+    def test_values_without_data(self):
+        interface = _FakeInterface({ENGINE_RPM: PCMValue(800, "rpm")})
+        publisher = BoardPublisher(
+            interface,
+            [ENGINE_RPM],
+            self._board_file_path,
+            )
+        reader = BoardReader(self._board_file_path)
+        publisher.publish_once(now=10)
+
+        interface.results_by_definition[ENGINE_RPM] = None
+        pcm_values = publisher.publish_once(now=11)
+
+        eq_({}, pcm_values)
+        eq_((PCMValue(800, "rpm"), 10), reader.read(ENGINE_RPM))
+
+        reader.close()
+        publisher.close()
+
+    def test_failed_reads(self):
+        interface = _FakeInterface({
+            ENGINE_RPM: PCMValue(800, "rpm"),
+            VEHICLE_SPEED: PCMValue(50, "km/h"),
+            })
+        publisher = BoardPublisher(
+            interface,
+            [ENGINE_RPM, VEHICLE_SPEED],
+            self._board_file_path,
+            )
+        reader = BoardReader(self._board_file_path)
+        publisher.publish_once(now=10)
+
+        interface.results_by_definition[ENGINE_RPM] = \
+            RequestTimeoutError()
+        interface.results_by_definition[VEHICLE_SPEED] = \
+            ELMError("Unexpected response")
+        pcm_values = publisher.publish_once(now=11)
+
+        eq_({}, pcm_values)
+        eq_((PCMValue(800, "rpm"), 10), reader.read(ENGINE_RPM))
+        eq_((PCMValue(50, "km/h"), 10), reader.read(VEHICLE_SPEED))
+
+        reader.close()
+        publisher.close()
+
+    def test_slot_being_written_for_too_long(self):
+        publisher = BoardPublisher(
+            _FakeInterface({}),
+            [ENGINE_RPM],
+            self._board_file_path,
+            )
+        reader = BoardReader(self._board_file_path)
+        publisher.publish(ENGINE_RPM, PCMValue(800, "rpm"), 10)
+
+        with open(self._board_file_path, "r+b") as board_file:
+            board_file.seek(_HEADER_SIZE)
+            board_file.write(b"\x03\x00\x00\x00")
+
+        with assert_raises(BoardError):
+            reader.read(ENGINE_RPM)
+
+        reader.close()
+        publisher.close()
+
+    def test_invalid_board_file(self):
+        with open(self._board_file_path, "wb") as board_file:
+            board_file.write(b"\x00" * 16)
+
+        with assert_raises(BoardError):
+            BoardReader(self._board_file_path)
+
+    def test_reading_from_another_process(self):
+        publisher = BoardPublisher(
+            _FakeInterface({}),
+            [ENGINE_RPM],
+            self._board_file_path,
+            )
+        reader = BoardReader(self._board_file_path)
+
+        process = Process(
+            target=_publish_values,
+            args=(self._board_file_path, 1000),
+            )
+        process.start()
+        while process.is_alive():
+            board_value = reader.read(ENGINE_RPM)
+            if board_value is not None:
+                pcm_value, timestamp = board_value
+                eq_(pcm_value.value, timestamp)
+        process.join()
+
+        eq_((PCMValue(999, "rpm"), 999), reader.read(ENGINE_RPM))
+
+        reader.close()
+        publisher.close()
+
+
+def _publish_values(board_file_path, value_count):
+    publisher = BoardPublisher(
+        _FakeInterface({}),
+        [ENGINE_RPM],
+        board_file_path,
+        )
+    for value in range(value_count):
+        publisher.publish(ENGINE_RPM, PCMValue(value, "rpm"), value)
+    publisher.close()
+
+
+class _FakeInterface(object):
+
+    def __init__(self, results_by_definition):
+        self.results_by_definition = results_by_definition
+
+    def read_pcm_value(self, definition, read_delay=None, deadline=None):
+        result = self.results_by_definition[definition]
+        if isinstance(result, Exception):
+            raise result
+        return result
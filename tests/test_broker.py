@@ -0,0 +1,170 @@
+################################################################################
+# The MIT License (MIT)
+#
+# Copyright (c) 2014 Francisco Ruiz
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+################################################################################
+
+from threading import Event
+from threading import Thread
+from time import sleep
+from time import time
+
+from nose.tools import assert_false
+from nose.tools import assert_is
+from nose.tools import assert_raises
+from nose.tools import eq_
+from nose.tools import ok_
+
+from elm327.broker import ConnectionBroker
+from elm327.connection import ConnectionError
+from elm327.connection import RequestTimeoutError
+
+
+class TestConnectionBroker(object):
+
+    def setup(self):
+        self.connection = _BlockingConnection()
+        self.broker = ConnectionBroker(self.connection)
+
+    def teardown(self):
+        self.connection.unblock()
+        self.broker.close()
+
+    def test_sending_command(self):
+        self.connection.unblock()
+
+        response = self.broker.send_command("01 0C")
+
+        eq_("response to '01 0C'", response)
+        eq_(["01 0C"], self.connection.commands_sent)
+
+    def test_identical_pending_requests_are_merged(self):
+        in_flight_future = self.broker.submit("AT Z")
+        self.connection.wait_for_command()
+
+        future1 = self.broker.submit("01 0C")
+        future2 = self.broker.submit("01 0C")
+        future3 = self.broker.submit("01 0D")
+        assert_is(future1, future2)
+
+        self.connection.unblock()
+
+        eq_("response to 'AT Z'", in_flight_future.result(1))
+        eq_("response to '01 0C'", future1.result(1))
+        eq_("response to '01 0D'", future3.result(1))
+        eq_(["AT Z", "01 0C", "01 0D"], self.connection.commands_sent)
+
+    def test_requests_from_several_threads(self):
+        responses = []
+
+        def read_value():
+            responses.append(self.broker.send_command("01 0C"))
+
+        threads = [Thread(target=read_value) for _ in range(5)]
+        for thread in threads:
+            thread.start()
+        self.connection.unblock()
+        for thread in threads:
+            thread.join(1)
+
+        eq_(["response to '01 0C'"] * 5, responses)
+        ok_(len(self.connection.commands_sent) <= 5)
+
+    def test_deadline(self):
+        deadline = time() + 0.1
+        with assert_raises(RequestTimeoutError):
+            self.broker.send_command("01 0C", deadline=deadline)
+
+        self.connection.wait_for_command()
+        eq_([deadline], self.connection.deadlines)
+
+    def test_requests_expired_in_queue_are_not_sent(self):
+        self.broker.submit("AT Z")
+        self.connection.wait_for_command()
+        future = self.broker.submit("01 0C", deadline=time() + 0.01)
+        sleep(0.02)
+
+        self.connection.unblock()
+
+        with assert_raises(RequestTimeoutError):
+            future.result(1)
+        self.broker.send_command("01 0D")
+        eq_(["AT Z", "01 0D"], self.connection.commands_sent)
+
+    def test_connection_error_is_propagated(self):
+        self.connection.unblock()
+
+        with assert_raises(ConnectionError):
+            self.broker.send_command("fail")
+
+    def test_closing(self):
+        self.connection.unblock()
+        self.broker.close()
+
+        ok_(self.connection.is_closed)
+        with assert_raises(ConnectionError):
+            self.broker.submit("01 0C")
+
+    def test_closing_with_pending_requests(self):
+        self.broker.submit("AT Z")
+        self.connection.wait_for_command()
+        future = self.broker.submit("01 0C")
+
+        closing_thread = Thread(target=self.broker.close)
+        closing_thread.start()
+        while not self.broker._is_closed:
+            sleep(0.001)
+        self.connection.unblock()
+        closing_thread.join(1)
+
+        assert_false(closing_thread.is_alive())
+        with assert_raises(ConnectionError):
+            future.result(1)
+
+
+class _BlockingConnection(object):
+
+    def __init__(self):
+        self.commands_sent = []
+        self.deadlines = []
+        self.is_closed = False
+
+        self._command_received = Event()
+        self._unblocked = Event()
+
+    def send_command(self, data, read_delay=None, deadline=None):
+        self.commands_sent.append(data)
+        self.deadlines.append(deadline)
+        self._command_received.set()
+        self._unblocked.wait(1)
+
+        if data == "fail":
+            raise ConnectionError()
+        return "response to {!r}".format(data)
+
+    def close(self):
+        self.is_closed = True
+
+    def wait_for_command(self):
+        self._command_received.wait(1)
+
+    def unblock(self):
+        self._unblocked.set()
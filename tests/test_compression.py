@@ -0,0 +1,127 @@
+################################################################################
+# The MIT License (MIT)
+#
+# Copyright (c) 2014 Francisco Ruiz
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+################################################################################
+
+from nose.tools import assert_false
+from nose.tools import eq_
+from nose.tools import ok_
+
+from elm327.compression import ChangeFilter
+from elm327.compression import DeadbandFilter
+from elm327.compression import SampleBlockDecoder
+from elm327.compression import SampleBlockEncoder
+from elm327.compression import UploadStage
+from elm327.pcm_values import ENGINE_COOLANT_TEMPERATURE
+from elm327.pcm_values import PCMValue
+from elm327.pcm_values import VEHICLE_SPEED
+
+
+class TestFilters(object):
+
+    def test_deadband_filter(self):
+        deadband_filter = DeadbandFilter(0.5)
+
+        eq_(
+            [True, False, False, True, True],
+            [deadband_filter(v) for v in (90, 90.5, 89.6, 91, 90)],
+            )
+
+    def test_change_filter(self):
+        change_filter = ChangeFilter()
+
+        eq_(
+            [True, False, True, True],
+            [change_filter(v) for v in ("a", "a", "b", "a")],
+            )
+
+
+class TestSampleBlockEncoding(object):
+
+    def test_round_trip(self):
+        samples = [
+            (1000, 90.0),
+            (1100, 90.0),
+            (1200, 90.5),
+            (1305, -12.25),
+            (1405, 1e300),
+            (1405, 0.0),
+            (5000000, 0.1),
+            (5000010, 0.2),
+            ]
+        encoder = SampleBlockEncoder(7)
+        for timestamp, value in samples:
+            encoder.append(timestamp, value)
+
+        blocks = SampleBlockDecoder().feed(encoder.finish())
+
+        eq_([(7, samples)], blocks)
+
+    def test_compression_of_regular_samples(self):
+        encoder = SampleBlockEncoder(0)
+        for sample_index in range(1000):
+            encoder.append(sample_index * 100, 90.0 + (sample_index // 100))
+
+        block = encoder.finish()
+
+        # Two bits per sample most of the time
+        ok_(len(block) < 300)
+
+    def test_streaming_decoding(self):
+        encoder1 = SampleBlockEncoder(1)
+        encoder1.append(0, 1.0)
+        encoder2 = SampleBlockEncoder(2)
+        encoder2.append(0, 2.0)
+        encoder2.append(10, 3.0)
+        data = encoder1.finish() + encoder2.finish()
+
+        decoder = SampleBlockDecoder()
+        blocks = []
+        for byte_index in range(len(data)):
+            blocks.extend(decoder.feed(data[byte_index:byte_index + 1]))
+
+        eq_([(1, [(0, 1.0)]), (2, [(0, 2.0), (10, 3.0)])], blocks)
+
+
+class TestUploadStage(object):
+
+    def test_filtering_and_encoding(self):
+        stage = UploadStage([
+            (ENGINE_COOLANT_TEMPERATURE, DeadbandFilter(1)),
+            (VEHICLE_SPEED, None),
+            ])
+
+        ok_(stage.add(ENGINE_COOLANT_TEMPERATURE, PCMValue(90, "C"), 0))
+        assert_false(
+            stage.add(ENGINE_COOLANT_TEMPERATURE, PCMValue(91, "C"), 0.1),
+            )
+        ok_(stage.add(VEHICLE_SPEED, PCMValue(50, "km/h"), 0.1))
+        ok_(stage.add(VEHICLE_SPEED, PCMValue(50, "km/h"), 0.2))
+        assert_false(stage.add(VEHICLE_SPEED, None, 0.3))
+
+        blocks = SampleBlockDecoder().feed(stage.flush())
+
+        eq_(
+            {0: [(0, 90.0)], 1: [(100, 50.0), (200, 50.0)]},
+            dict(blocks),
+            )
+        eq_(b"", stage.flush())
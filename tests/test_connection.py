@@ -1,9 +1,13 @@
 from datetime import datetime
+import time
 
 from nose.tools import assert_almost_equal
 from nose.tools import assert_is_none
+from nose.tools import assert_raises
 from nose.tools import eq_
+from nose.tools import ok_
 
+from elm327.connection import RequestTimeoutError
 from elm327.connection import SerialConnection
 
 from tests.utils import MockSerialPort
@@ -86,6 +90,145 @@ class TestSerialConnection(object):
 
         eq_("ab cd ef", response)
 
+    # { Strict prompt mode tests
+
+    def test_strict_prompt_mode_flushes_only_before_first_command(self):
+        mock_data_reader = MockSerialPortDataReader("OK>41 0C 1A F8>")
+        mock_port = MockSerialPort(reader=mock_data_reader)
+        connection = SerialConnection(mock_port, strict_prompt=True)
+
+        eq_("OK", connection.send_command("AT E0"))
+        eq_("41 0C 1A F8", connection.send_command("01 0C"))
+
+        mock_port.assert_scenario(
+            ("flushInput", (), {}),
+            ("flushOutput", (), {}),
+            ("write", ("AT E0",), {}),
+            ("write", ("\n\r",), {}),
+            ("read", (1,), {}),
+            ("read", (1,), {}),
+            ("read", (1,), {}),
+            ("write", ("01 0C",), {}),
+            ("write", ("\n\r",), {}),
+            )
+
+    def test_strict_prompt_mode_resynchronizes_after_timeout(self):
+        mock_data_reader = MockSerialPortDataReader("OK>41 0C")
+        mock_port = MockSerialPort(reader=mock_data_reader)
+        connection = SerialConnection(mock_port, strict_prompt=True)
+        connection.send_command("AT E0")
+        connection.send_command("01 0C")
+
+        mock_port._method_calls = []
+        connection.send_command("01 0C")
+
+        mock_port.assert_method_was_called("flushInput")
+        mock_port.assert_method_was_called("flushOutput")
+
+    def test_strict_prompt_mode_resynchronizes_after_interruption(self):
+        mock_data_reader = MockSerialPortDataReader("OK>STOPPED>")
+        mock_port = MockSerialPort(reader=mock_data_reader)
+        connection = SerialConnection(mock_port, strict_prompt=True)
+        connection.send_command("AT E0")
+        connection.send_command("01 0C")
+
+        mock_port._method_calls = []
+        connection.send_command("01 0C")
+
+        mock_port.assert_method_was_called("flushInput")
+
+    def test_strict_prompt_mode_skips_stale_prompt(self):
+        mock_data_reader = MockSerialPortDataReader("OK>\r>41 0C 1A F8>")
+        mock_port = MockSerialPort(reader=mock_data_reader)
+        connection = SerialConnection(mock_port, strict_prompt=True)
+        connection.send_command("AT E0")
+
+        response = connection.send_command("01 0C")
+
+        eq_("41 0C 1A F8", response)
+
+
+class TestDeadlines(object):
+
+    def test_expired_deadline(self):
+        device = _DeviceStandIn(["41 0D"])
+        mock_port = MockSerialPort(writer=device, reader=device)
+        connection = SerialConnection(mock_port, strict_prompt=True)
+
+        with assert_raises(RequestTimeoutError):
+            connection.send_command("01 0D", deadline=time.time() - 1)
+
+        eq_("01 0D\n\r\r", device.data_written)
+
+    def test_expired_deadline_with_response_received(self):
+        mock_data_reader = MockSerialPortDataReader("41 0D 32>")
+        mock_port = MockSerialPort(reader=mock_data_reader)
+        connection = SerialConnection(mock_port, strict_prompt=True)
+
+        response = connection.send_command("01 0D", deadline=time.time() - 1)
+
+        eq_("41 0D 32", response)
+        mock_port.assert_data_was_written("01 0D")
+
+    def test_command_is_resynchronized_after_expired_deadline(self):
+        device = _DeviceStandIn(["41 0D", "STOPPED\r\r>", "41 0D 32\r\r>"])
+        mock_port = MockSerialPort(writer=device, reader=device)
+        connection = SerialConnection(mock_port, strict_prompt=True)
+        with assert_raises(RequestTimeoutError):
+            connection.send_command("01 0D", deadline=time.time() - 1)
+
+        response = connection.send_command("01 0D", deadline=time.time() + 60)
+
+        eq_("41 0D 32\r\r", response)
+
+    def test_resynchronization_is_bounded_by_deadline(self):
+        device = _DeviceStandIn(["41 0D"])
+        mock_port = MockSerialPort(writer=device, reader=device)
+        connection = SerialConnection(mock_port, strict_prompt=True)
+        with assert_raises(RequestTimeoutError):
+            connection.send_command("01 0D", deadline=time.time() - 1)
+
+        with assert_raises(RequestTimeoutError):
+            connection.send_command("01 0D", deadline=time.time() - 1)
+
+        eq_("01 0D\n\r\r", device.data_written)
+
+    def test_response_is_read_in_chunks_with_deadline(self):
+        device = _DeviceStandIn(["41 0D 32\r\r>"])
+        mock_port = _MockSerialPortWithReadTimeouts(
+            writer=device,
+            reader=device,
+            )
+        connection = SerialConnection(mock_port)
+
+        response = connection.send_command("01 0D", deadline=time.time() + 60)
+
+        eq_("41 0D 32\r\r", response)
+        eq_(1, len(mock_port.read_timeouts))
+
+    def test_reads_are_bounded_by_deadline(self):
+        device = _DeviceStandIn([""])
+        mock_port = _MockSerialPortWithReadTimeouts(
+            writer=device,
+            reader=device,
+            )
+        mock_port.timeout = 120
+        connection = SerialConnection(mock_port)
+
+        connection.send_command("01 0D", deadline=time.time() + 60)
+
+        ok_(59 < mock_port.read_timeouts[0] <= 60)
+        eq_(120, mock_port.timeout)
+
+    def test_deadline_not_expired(self):
+        mock_data_reader = MockSerialPortDataReader("41 0D 32>")
+        mock_port = MockSerialPort(reader=mock_data_reader)
+        connection = SerialConnection(mock_port)
+
+        response = connection.send_command("01 0D", deadline=time.time() + 60)
+
+        eq_("41 0D 32", response)
+
 
 class _MockSerialPortWithTimings(MockSerialPort):
 
@@ -102,3 +245,50 @@ class _MockSerialPortWithTimings(MockSerialPort):
     def write(self, data):
         super(_MockSerialPortWithTimings, self).write(data)
         self._last_write_time = datetime.now()
+
+
+class _MockSerialPortWithReadTimeouts(MockSerialPort):
+
+    def __init__(self, *args, **kwargs):
+        super(_MockSerialPortWithReadTimeouts, self).__init__(*args, **kwargs)
+
+        self.read_timeouts = []
+
+    def read(self, *args, **kwargs):
+        self.read_timeouts.append(self.timeout)
+        return super(_MockSerialPortWithReadTimeouts, self).read(
+            *args,
+            **kwargs
+            )
+
+
+class _DeviceStandIn(object):
+    """
+    Writer and reader of a port connected to a device.
+
+    Like a device, each response is only output after a carriage return,
+    which ends a command or interrupts the previous response.
+
+    """
+
+    def __init__(self, responses):
+        self._responses = list(responses)
+
+        self.data_written = ""
+        self.data_read = ""
+        self._unread_data = ""
+
+    def write(self, data):
+        self.data_written += data
+        if data.endswith("\r"):
+            self._unread_data = \
+                self._responses.pop(0) if self._responses else ""
+
+    def read(self, size):
+        chunk = self._unread_data[:size]
+        self._unread_data = self._unread_data[size:]
+        self.data_read += chunk
+        return chunk
+
+    def count_unread_characters(self):
+        return len(self._unread_data)
@@ -4,6 +4,7 @@ from nose.tools import assert_is_instance
 from nose.tools import assert_is_none
 from nose.tools import assert_raises
 from nose.tools import eq_
+from nose.tools import ok_
 from serial.serialutil import SerialException
 from serial.tools.list_ports import comports
 
@@ -42,6 +43,16 @@ class TestSerialConnectionFactory(object):
         mock_port = connection._port
         eq_({"baudrate": 38400, "extra_arg": 10}, mock_port.init_kwargs)
 
+    def test_connecting_in_strict_prompt_mode(self):
+        factory = SerialConnectionFactory(
+            port_class=_InitializableMockSerialPort,
+            strict_prompt=True,
+            )
+        connection = factory.connect("/dev/pts/1")
+
+        ok_(connection._strict_prompt)
+        eq_({"baudrate": 38400}, connection._port.init_kwargs)
+
     def test_serial_port_error_when_connecting(self):
         port_class = _SerialPortCommunicationError
         factory = SerialConnectionFactory(port_class)
@@ -0,0 +1,155 @@
+################################################################################
+# The MIT License (MIT)
+#
+# Copyright (c) 2014 Francisco Ruiz
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+################################################################################
+
+from nose.tools import assert_raises
+from nose.tools import eq_
+
+from elm327.derived import DerivedChannel
+from elm327.derived import DerivedChannelEngine
+from elm327.derived import FUEL_ECONOMY
+from elm327.derived import Integrator
+from elm327.derived import MovingAverage
+from elm327.derived import make_distance_channel
+from elm327.pcm_values import ENGINE_FUEL_RATE
+from elm327.pcm_values import ENGINE_RPM
+from elm327.pcm_values import PCMValue
+from elm327.pcm_values import VEHICLE_SPEED
+
+
+class TestDerivedChannelEngine(object):
+
+    def test_fuel_economy(self):
+        engine = DerivedChannelEngine([FUEL_ECONOMY])
+
+        eq_({}, engine.update(ENGINE_FUEL_RATE, PCMValue(5.0, "L/h"), 0))
+        updated_values = \
+            engine.update(VEHICLE_SPEED, PCMValue(100, "km/h"), 1)
+
+        eq_({FUEL_ECONOMY: PCMValue(5.0, "L/100km")}, updated_values)
+
+    def test_fuel_economy_while_stopped(self):
+        engine = DerivedChannelEngine([FUEL_ECONOMY])
+        engine.update(ENGINE_FUEL_RATE, PCMValue(0.5, "L/h"), 0)
+
+        updated_values = engine.update(VEHICLE_SPEED, PCMValue(0, "km/h"), 1)
+
+        eq_({FUEL_ECONOMY: None}, updated_values)
+
+    def test_only_affected_channels_are_updated(self):
+        calls = []
+
+        def double(timestamp, value):
+            calls.append(value)
+            return value * 2
+
+        doubled_speed = DerivedChannel("2 x speed", [VEHICLE_SPEED], double)
+        engine = DerivedChannelEngine([doubled_speed, FUEL_ECONOMY])
+
+        engine.update(ENGINE_RPM, PCMValue(800, "rpm"), 0)
+        engine.update(ENGINE_FUEL_RATE, PCMValue(5.0, "L/h"), 0)
+        eq_([], calls)
+
+        updated_values = engine.update(VEHICLE_SPEED, PCMValue(50, "km/h"), 1)
+        eq_([50], calls)
+        eq_(set([doubled_speed, FUEL_ECONOMY]), set(updated_values))
+
+    def test_chained_channels(self):
+        distance = make_distance_channel()
+        distance_in_metres = DerivedChannel(
+            "Distance in metres",
+            [distance],
+            lambda timestamp, value: value * 1000,
+            unit="m",
+            )
+        engine = DerivedChannelEngine([distance_in_metres, distance])
+
+        engine.update(VEHICLE_SPEED, PCMValue(36, "km/h"), 0)
+        updated_values = engine.update(VEHICLE_SPEED, PCMValue(36, "km/h"), 10)
+
+        eq_(PCMValue(100, "m"), updated_values[distance_in_metres])
+        eq_(PCMValue(0.1, "km"), engine.get_value(distance))
+        eq_(PCMValue(36, "km/h"), engine.get_value(VEHICLE_SPEED))
+
+    def test_cyclic_dependency(self):
+        channel1 = DerivedChannel("1", [], lambda timestamp: 1)
+        channel2 = DerivedChannel("2", [channel1], lambda timestamp, v: v)
+        channel1.inputs = (channel2, )
+
+        with assert_raises(ValueError):
+            DerivedChannelEngine([channel1, channel2])
+
+    def test_batch_processing(self):
+        engine = DerivedChannelEngine([FUEL_ECONOMY])
+
+        derived_samples_by_channel = engine.process_batch({
+            ENGINE_FUEL_RATE: [(0, 5.0), (2, 6.0)],
+            VEHICLE_SPEED: [(1, 100), (3, 50)],
+            })
+
+        eq_(
+            {FUEL_ECONOMY: [(1, 5.0), (2, 6.0), (3, 12.0)]},
+            derived_samples_by_channel,
+            )
+
+    def test_batch_processing_with_own_state(self):
+        distance = make_distance_channel()
+        engine = DerivedChannelEngine([distance])
+        engine.update(VEHICLE_SPEED, PCMValue(36, "km/h"), 0)
+
+        for _ in range(2):
+            derived_samples_by_channel = engine.process_batch({
+                VEHICLE_SPEED: [(100, 72), (110, 72)],
+                })
+            eq_([(100, 0), (110, 0.2)], derived_samples_by_channel[distance])
+
+        updated_values = engine.update(VEHICLE_SPEED, PCMValue(36, "km/h"), 10)
+        eq_(PCMValue(0.1, "km"), updated_values[distance])
+
+    def test_function_and_factory_are_exclusive(self):
+        with assert_raises(ValueError):
+            DerivedChannel("Distance", [VEHICLE_SPEED])
+        with assert_raises(ValueError):
+            DerivedChannel(
+                "Distance",
+                [VEHICLE_SPEED],
+                Integrator(),
+                function_factory=Integrator,
+                )
+
+
+class TestStatefulFunctions(object):
+
+    def test_integrator(self):
+        integrator = Integrator(scale=2)
+
+        eq_(0, integrator(0, 10))
+        eq_(30, integrator(1, 20))
+        eq_(70, integrator(2, 20))
+
+    def test_moving_average(self):
+        moving_average = MovingAverage(2)
+
+        eq_(10, moving_average(0, 10))
+        eq_(15, moving_average(1, 20))
+        eq_(25, moving_average(2, 30))
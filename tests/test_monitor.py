@@ -0,0 +1,132 @@
+################################################################################
+# The MIT License (MIT)
+#
+# Copyright (c) 2014 Francisco Ruiz
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+################################################################################
+
+from nose.tools import eq_
+
+from elm327.connection import SerialConnection
+from elm327.monitor import CANFrame
+from elm327.monitor import CANFrameParser
+from elm327.monitor import CANMonitor
+from elm327.pcm_values import NumericValueParser
+from elm327.pcm_values import PCMValue
+
+from tests.utils import MockSerialPort
+from tests.utils import MockSerialPortDataReader
+
+
+class TestCANFrameParser(object):
+
+    def test_standard_id_frames(self):
+        parser = CANFrameParser()
+
+        frames = parser.feed("7E8 03 41 0D 32\r0C9 1A F8\r", timestamp=1)
+
+        eq_(
+            [
+                CANFrame(0x7E8, (0x03, 0x41, 0x0D, 0x32), 1),
+                CANFrame(0x0C9, (0x1A, 0xF8), 1),
+                ],
+            frames,
+            )
+
+    def test_extended_id_frames(self):
+        parser = CANFrameParser(extended_ids=True)
+
+        frames = parser.feed("18 DA F1 10 03 41 0D 32\r", timestamp=1)
+
+        eq_([CANFrame(0x18DAF110, (0x03, 0x41, 0x0D, 0x32), 1)], frames)
+
+    def test_frames_split_between_chunks(self):
+        parser = CANFrameParser()
+
+        eq_([], parser.feed("7E8 03 4", timestamp=1))
+        frames = parser.feed("1 0D 32\r", timestamp=2)
+
+        eq_([CANFrame(0x7E8, (0x03, 0x41, 0x0D, 0x32), 2)], frames)
+
+    def test_buffer_overrun(self):
+        parser = CANFrameParser()
+
+        frames = parser.feed("7E8 01 02\rBUFFER FULL\r\r>", timestamp=1)
+
+        eq_([CANFrame(0x7E8, (0x01, 0x02), 1)], frames)
+        eq_(1, parser.overruns_count)
+        eq_(True, parser.is_prompt_found)
+
+    def test_unexpected_lines(self):
+        parser = CANFrameParser()
+
+        frames = parser.feed("SEARCHING...\rCAN ERROR\rSTOPPED\r", timestamp=1)
+
+        eq_([], frames)
+
+
+class TestCANMonitor(object):
+
+    def test_monitoring(self):
+        port = _make_mock_port("OK>7E8 01 02\r0C9 1A F8\r7E8 03 04\r")
+        connection = SerialConnection(port)
+        monitor = CANMonitor(
+            connection,
+            {0x0C9: NumericValueParser("rpm", lambda v: v / 4)},
+            )
+        monitor.start()
+
+        frames = monitor.poll()
+
+        eq_(3, len(frames))
+        eq_((0x03, 0x04), monitor.latest_frames[0x7E8].data)
+        eq_({0x0C9: PCMValue(1726, "rpm")}, monitor.latest_values)
+        port.assert_data_was_written("AT H1\n\rAT MA")
+
+    def test_receive_address_filter(self):
+        port = _make_mock_port("OK>OK>")
+        monitor = CANMonitor(SerialConnection(port), receive_address=0x7E8)
+        monitor.start()
+
+        port.assert_data_was_written("AT H1\n\rAT CRA 7E8\n\rAT MA")
+
+    def test_monitoring_is_restarted_after_overrun(self):
+        port = _make_mock_port("OK>7E8 01 02\rBUFFER FULL\r\r>")
+        monitor = CANMonitor(SerialConnection(port))
+        monitor.start()
+
+        monitor.poll()
+
+        eq_(1, monitor.overruns_count)
+        port.assert_data_was_written("AT H1\n\rAT MA\n\rAT MA")
+
+    def test_stopping(self):
+        port = _make_mock_port("OK>7E8 01 02\rSTOPPED\r\r>OK>")
+        monitor = CANMonitor(SerialConnection(port))
+        monitor.start()
+
+        frames = monitor.stop()
+
+        eq_([0x7E8], [frame.can_id for frame in frames])
+        port.assert_data_was_written("AT H1\n\rAT MA\n\r\rAT H0")
+
+
+def _make_mock_port(data):
+    return MockSerialPort(reader=MockSerialPortDataReader(data))
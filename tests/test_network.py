@@ -0,0 +1,304 @@
+################################################################################
+# The MIT License (MIT)
+#
+# Copyright (c) 2014 Francisco Ruiz
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+################################################################################
+
+from select import select
+from threading import Thread
+from time import sleep
+from time import time
+import socket
+
+from nose.tools import assert_false
+from nose.tools import assert_is_not
+from nose.tools import assert_raises
+from nose.tools import eq_
+from nose.tools import ok_
+
+from elm327.connection import ConnectionError
+from elm327.connection import RequestTimeoutError
+from elm327.network import SocketConnection
+from elm327.network import SocketConnectionFactory
+from elm327.network import SocketConnectionPool
+
+
+class TestSocketConnection(object):
+
+    def setup(self):
+        self.server = _StandInServer({"01 0C": "41 0C 1A F8\r\r>"})
+        self.factory = SocketConnectionFactory()
+
+    def teardown(self):
+        self.server.close()
+
+    def test_sending_command(self):
+        connection = self.factory.connect(self.server.url)
+
+        eq_("41 0C 1A F8\r\r", connection.send_command("01 0C"))
+        eq_("?\r\r", connection.send_command("01 0D"))
+        eq_(["01 0C", "01 0D"], self.server.commands_received)
+
+        connection.close()
+
+    def test_closing(self):
+        connection = self.factory.connect(self.server.url)
+        connection.close()
+
+        assert_false(connection.is_alive())
+
+    def test_socket_options(self):
+        connection = self.factory.connect(self.server.url)
+
+        sock = connection._socket
+        ok_(sock.getsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY))
+        ok_(sock.getsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE))
+
+        connection.close()
+
+    def test_expired_deadline(self):
+        self.server.response_delays["01 0C"] = 5
+        connection = self.factory.connect(self.server.url)
+
+        with assert_raises(RequestTimeoutError):
+            connection.send_command("01 0C", deadline=time() + 0.1)
+        response = connection.send_command("01 0D")
+
+        eq_("?\r\r", response)
+        eq_(["01 0C", "\r", "01 0D"], self.server.commands_received)
+
+        connection.close()
+
+    def test_late_response_is_discarded(self):
+        self.server.response_delays["01 0C"] = 0.2
+        connection = self.factory.connect(self.server.url)
+        connection._socket.settimeout(0.1)
+
+        eq_("", connection.send_command("01 0C"))
+        sleep(0.2)
+        response = connection.send_command("01 0D")
+
+        eq_("?\r\r", response)
+        eq_(["01 0C", "01 0D"], self.server.commands_received)
+
+        connection.close()
+
+    def test_expired_deadline_with_response_received(self):
+        connection = self.factory.connect(self.server.url)
+
+        response = connection.send_command(
+            "01 0C",
+            read_delay=0.2,
+            deadline=time() + 0.1,
+            )
+
+        eq_("41 0C 1A F8\r\r", response)
+        eq_(["01 0C"], self.server.commands_received)
+
+        connection.close()
+
+    def test_deadline_not_expired(self):
+        self.server.response_delays["01 0C"] = 0.1
+        connection = self.factory.connect(self.server.url)
+
+        response = connection.send_command("01 0C", deadline=time() + 60)
+
+        eq_("41 0C 1A F8\r\r", response)
+        eq_(["01 0C"], self.server.commands_received)
+
+        connection.close()
+
+    def test_connecting_to_unreachable_device(self):
+        port = self.server.port
+        self.server.close()
+
+        with assert_raises(ConnectionError):
+            self.factory.connect("tcp://127.0.0.1:{}".format(port))
+
+    def test_invalid_urls(self):
+        for url in ("/dev/pts/1", "tcp://:35000", "tcp://localhost:port"):
+            with assert_raises(ConnectionError):
+                self.factory.connect(url)
+
+
+class TestSocketConnectionPool(object):
+
+    def setup(self):
+        self.server = _StandInServer({})
+        self.pool = SocketConnectionPool()
+        self.factory = SocketConnectionFactory(self.pool)
+
+    def teardown(self):
+        self.pool.clear()
+        self.server.close()
+
+    def test_connection_reuse(self):
+        connection1 = self.factory.connect(self.server.url)
+        connection1.send_command("01 0C")
+        connection1.close()
+        connection2 = self.factory.connect(self.server.url)
+        connection2.send_command("01 0C")
+
+        eq_(1, self.server.connections_count)
+        eq_(["01 0C", "01 0C"], self.server.commands_received)
+
+    def test_releasing_twice(self):
+        connection1 = self.factory.connect(self.server.url)
+        connection1.send_command("01 0C")
+        connection1.close()
+        connection1.close()
+
+        connection2 = self.factory.connect(self.server.url)
+        connection3 = self.factory.connect(self.server.url)
+
+        assert_is_not(connection2._socket, connection3._socket)
+        eq_(2, self.server.connections_count)
+
+    def test_releasing_after_reuse(self):
+        connection1 = self.factory.connect(self.server.url)
+        connection1.close()
+        connection2 = self.factory.connect(self.server.url)
+        connection1.close()
+        connection3 = self.factory.connect(self.server.url)
+
+        assert_false(connection1.is_alive())
+        ok_(connection2.is_alive())
+        assert_is_not(connection2._socket, connection3._socket)
+
+    def test_connections_in_use_are_not_shared(self):
+        connection1 = self.factory.connect(self.server.url)
+        connection2 = self.factory.connect(self.server.url)
+
+        assert_is_not(connection1, connection2)
+
+    def test_dead_connections_are_discarded(self):
+        connection1 = self.factory.connect(self.server.url)
+        connection1.send_command("01 0C")
+        sock = connection1._socket
+        connection1.close()
+        self.server.drop_connections()
+        _wait_for_disconnection(SocketConnection(sock, connection1.address))
+
+        connection2 = self.factory.connect(self.server.url)
+
+        assert_is_not(sock, connection2._socket)
+        eq_(2, self.server.connections_count)
+
+    def test_idle_connections_are_evicted(self):
+        pool = SocketConnectionPool(max_idle_time=-1)
+        factory = SocketConnectionFactory(pool)
+
+        connection1 = factory.connect(self.server.url)
+        connection1.close()
+        connection2 = factory.connect(self.server.url)
+
+        assert_is_not(connection1, connection2)
+        assert_false(connection1.is_alive())
+        connection2.disconnect()
+
+
+def _wait_for_disconnection(connection, timeout=1):
+    deadline = time() + timeout
+    while connection.is_alive() and time() < deadline:
+        sleep(0.01)
+
+
+class _StandInServer(object):
+    """
+    Local TCP server that answers like an ELM327 device.
+
+    The responses to the commands in "response_delays" are sent after the
+    corresponding delay, unless they are interrupted by a carriage return.
+
+    """
+
+    def __init__(self, responses):
+        self._responses = responses
+
+        self.response_delays = {}
+
+        self.commands_received = []
+        self.connections_count = 0
+        self._client_sockets = []
+        self._is_closed = False
+
+        self._socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self._socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._socket.bind(("127.0.0.1", 0))
+        self._socket.listen(5)
+        self.port = self._socket.getsockname()[1]
+        self.url = "tcp://127.0.0.1:{}".format(self.port)
+
+        thread = Thread(target=self._accept_connections)
+        thread.daemon = True
+        thread.start()
+
+    def close(self):
+        if self._is_closed:
+            return
+        self._is_closed = True
+
+        self.drop_connections()
+        self._socket.shutdown(socket.SHUT_RDWR)
+        self._socket.close()
+
+    def drop_connections(self):
+        for client_socket in self._client_sockets:
+            client_socket.shutdown(socket.SHUT_RDWR)
+            client_socket.close()
+        self._client_sockets = []
+
+    def _accept_connections(self):
+        while True:
+            try:
+                client_socket = self._socket.accept()[0]
+            except socket.error:
+                return
+            self.connections_count += 1
+            self._client_sockets.append(client_socket)
+
+            thread = Thread(target=self._serve, args=(client_socket,))
+            thread.daemon = True
+            thread.start()
+
+    def _serve(self, client_socket):
+        buffer = ""
+        while True:
+            try:
+                chunk = client_socket.recv(1024)
+            except socket.error:
+                return
+            if not chunk:
+                return
+            buffer += chunk
+            while "\n\r" in buffer:
+                command, _, buffer = buffer.partition("\n\r")
+                self.commands_received.append(command)
+
+                response_delay = self.response_delays.get(command)
+                if response_delay and \
+                        select([client_socket], [], [], response_delay)[0]:
+                    interruption = client_socket.recv(1)
+                    self.commands_received.append(interruption)
+                    response = "STOPPED\r\r>"
+                else:
+                    response = self._responses.get(command, "?\r\r>")
+                client_socket.sendall(response)
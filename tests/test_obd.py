@@ -1,4 +1,7 @@
+from tempfile import mkdtemp
 from unittest.case import skip
+import os
+import shutil
 
 from nose.tools import assert_false
 from nose.tools import assert_is_none
@@ -6,16 +9,27 @@ from nose.tools import assert_raises
 from nose.tools import eq_
 from nose.tools import ok_
 
+from elm327.obd import ADAPTER_WARM_START_COMMAND
+from elm327.obd import DataIdentifierCommand
+from elm327.obd import ELMError
 from elm327.obd import OBDCommand
 from elm327.obd import OBDInterface
+from elm327.obd import ProtocolCache
 from elm327.obd import ValueNotAvailableError
+from elm327.pcm_values import BitField
+from elm327.pcm_values import BitfieldParser
 from elm327.pcm_values import BitwiseEncodedValueParser
+from elm327.pcm_values import DRIVE_CYCLE_MONITOR_STATUS
 from elm327.pcm_values import EnumeratedValueParser
+from elm327.pcm_values import FUEL_SYSTEM_STATUS
+from elm327.pcm_values import MONITOR_STATUS
 from elm327.pcm_values import NumericValueParser
 from elm327.pcm_values import PCMValue
 from elm327.pcm_values import PCMValueDefinition
 from elm327.pcm_values import PERCENTAGE_VALUE_PARSER
 
+from tests.utils import DeviceEmulator
+
 
 _STUB_OBD_COMMAND = OBDCommand(0x01, 0x10)
 
@@ -26,6 +40,33 @@ _STUB_PCM_VALUE_DEFINITION = PCMValueDefinition(
     )
 
 
+_SIZED_DEFINITIONS = [
+    PCMValueDefinition(
+        OBDCommand(0x01, 0x0C),
+        NumericValueParser("rpm", value_scaler=lambda v: v / 4),
+        byte_count=2,
+        ),
+    PCMValueDefinition(
+        OBDCommand(0x01, 0x0D),
+        NumericValueParser("km/h"),
+        byte_count=1,
+        ),
+    PCMValueDefinition(
+        OBDCommand(0x01, 0x05),
+        NumericValueParser("C", value_scaler=lambda v: v - 40),
+        byte_count=1,
+        ),
+    PCMValueDefinition(OBDCommand(0x01, 0x2F), NumericValueParser()),
+    ]
+
+_EXPECTED_PCM_VALUES = {
+    _SIZED_DEFINITIONS[0]: PCMValue(1726, "rpm"),
+    _SIZED_DEFINITIONS[1]: PCMValue(50, "km/h"),
+    _SIZED_DEFINITIONS[2]: PCMValue(83, "C"),
+    _SIZED_DEFINITIONS[3]: None,
+    }
+
+
 class TestOBDCommand(object):
 
     def test_conversion_to_hex_words(self):
@@ -100,6 +141,17 @@ class TestOBDInterface(object):
             PCMValue("Gasoline"),
             )
 
+    def test_bitfield_value(self):
+        pcm_value_definition = PCMValueDefinition(
+            _STUB_OBD_COMMAND,
+            BitfieldParser([BitField("flag", 1, 7)]),
+            )
+        self._test_pcm_value_reading(
+            pcm_value_definition,
+            "00 80",
+            PCMValue((True,)),
+            )
+
     @staticmethod
     def _test_pcm_value_reading(pcm_value_definition, raw_data, expected_value):
         command = pcm_value_definition.command
@@ -112,6 +164,24 @@ class TestOBDInterface(object):
 
         eq_(expected_value, actual_value)
 
+    def test_error_responses(self):
+        error_responses = (
+            "CAN ERROR",
+            "STOPPED",
+            "UNABLE TO CONNECT",
+            "BUS INIT: ...ERROR",
+            "",
+            "41 0C 1A F8",
+            )
+        for error_response in error_responses:
+            connection = _ScriptedConnection({"01 10": error_response})
+            interface = OBDInterface(connection)
+
+            for _ in range(2):
+                with assert_raises(ELMError):
+                    interface.read_pcm_value(_STUB_PCM_VALUE_DEFINITION)
+            eq_(["01 10", "01 10"], connection.commands_sent)
+
     def test_no_data_received(self):
         connection = _ConstantResponseConnection("NO DATA")
         interface = OBDInterface(connection)
@@ -149,6 +219,469 @@ class TestOBDInterface(object):
             interface.read_pcm_value(_STUB_PCM_VALUE_DEFINITION)
 
 
+class TestBitfieldParser(object):
+
+    def test_fields(self):
+        parser = BitfieldParser(
+            [
+                BitField("high_flag", 0, 7),
+                BitField("counter", 0, 0, bit_count=3),
+                BitField("state", 1, 2, bit_count=2, enumeration={1: "On"}),
+                BitField("low_flag", 0, 3),
+                ],
+            type_name="Status",
+            )
+
+        pcm_value = parser((0x8D, 0x04))
+
+        eq_("Status", pcm_value.value.__class__.__name__)
+        eq_(True, pcm_value.value.high_flag)
+        eq_(5, pcm_value.value.counter)
+        eq_("On", pcm_value.value.state)
+        eq_(True, pcm_value.value.low_flag)
+        eq_((True, 5, "On", True), pcm_value.value)
+
+    def test_values_not_in_enumeration(self):
+        parser = BitfieldParser(
+            [BitField("state", 0, 0, bit_count=2, enumeration={1: "On"})],
+            )
+
+        eq_(PCMValue((3,)), parser((0x03,)))
+
+    def test_fields_not_fitting_in_byte(self):
+        with assert_raises(ValueError):
+            BitField("field", 0, 6, bit_count=3)
+
+    def test_batch_parsing(self):
+        parser = BitfieldParser(
+            [BitField("first", 1, 0), BitField("second", 0, 0, bit_count=8)],
+            )
+        responses_bytes = [(0x00, 0x01), (0xFF, 0x00), (0x10, 0x03)]
+
+        pcm_values = parser.parse_batch(responses_bytes)
+
+        eq_(
+            [parser(response_bytes) for response_bytes in responses_bytes],
+            pcm_values,
+            )
+        eq_(
+            [PCMValue((True, 0)), PCMValue((False, 255)), PCMValue((True, 16))],
+            pcm_values,
+            )
+
+    def test_monitor_status(self):
+        pcm_value = MONITOR_STATUS.parser((0x83, 0x07, 0x65, 0x04))
+        monitor_status = pcm_value.value
+
+        ok_(monitor_status.is_mil_on)
+        eq_(3, monitor_status.trouble_code_count)
+        assert_false(monitor_status.is_compression_ignition)
+        ok_(monitor_status.misfire_available)
+        assert_false(monitor_status.misfire_incomplete)
+        ok_(monitor_status.evaporative_system_available)
+        ok_(monitor_status.evaporative_system_incomplete)
+        ok_(monitor_status.catalyst_available)
+        assert_false(monitor_status.catalyst_incomplete)
+        assert_false(monitor_status.egr_system_available)
+
+    def test_drive_cycle_monitor_status(self):
+        pcm_value = DRIVE_CYCLE_MONITOR_STATUS.parser((0x00, 0x21, 0x01, 0x01))
+        monitor_status = pcm_value.value
+
+        ok_(monitor_status.misfire_available)
+        ok_(monitor_status.fuel_system_incomplete)
+        ok_(monitor_status.catalyst_incomplete)
+
+    def test_fuel_system_status(self):
+        pcm_value = FUEL_SYSTEM_STATUS.parser((0x02, 0x00))
+
+        eq_("Closed loop", pcm_value.value.fuel_system_1)
+        eq_("Not present", pcm_value.value.fuel_system_2)
+
+
+class TestMultipleValuesReading(object):
+
+    _DATA_BY_PID = {0x0C: [0x1A, 0xF8], 0x0D: [0x32], 0x05: [0x7B]}
+
+    def test_batched_reading(self):
+        device_emulator = DeviceEmulator(self._DATA_BY_PID)
+        interface = OBDInterface(device_emulator)
+
+        pcm_values = interface.read_pcm_values(_SIZED_DEFINITIONS)
+
+        eq_(_EXPECTED_PCM_VALUES, pcm_values)
+        eq_(
+            ["01 2F", "STI", "01 0C 0D 05"],
+            device_emulator.commands_sent[2:],
+            )
+
+    def test_batched_reading_on_stn_device(self):
+        device_emulator = DeviceEmulator(self._DATA_BY_PID, is_stn_device=True)
+        interface = OBDInterface(device_emulator)
+
+        pcm_values = interface.read_pcm_values(_SIZED_DEFINITIONS)
+        interface.read_pcm_values(_SIZED_DEFINITIONS)
+
+        eq_(_EXPECTED_PCM_VALUES, pcm_values)
+        eq_(
+            [
+                "01 2F",
+                "STI",
+                "STPX D:010C0D05, R:1",
+                "01 2F",
+                "STPX D:010C0D05, R:1",
+                ],
+            device_emulator.commands_sent[2:],
+            )
+
+    def test_batch_size(self):
+        device_emulator = DeviceEmulator(self._DATA_BY_PID)
+        interface = OBDInterface(device_emulator)
+
+        pcm_values = interface.read_pcm_values(
+            _SIZED_DEFINITIONS,
+            max_pids_per_request=2,
+            )
+
+        eq_(_EXPECTED_PCM_VALUES, pcm_values)
+        eq_(
+            ["01 2F", "STI", "01 0C 0D", "01 05"],
+            device_emulator.commands_sent[2:],
+            )
+
+    def test_multi_pid_requests_not_supported(self):
+        connection = _ScriptedConnection({
+            "01 0C 0D 05": "?",
+            "01 0C": "41 0C 1A F8",
+            "01 0D": "41 0D 32",
+            "01 05": "41 05 7B",
+            })
+        interface = OBDInterface(connection)
+
+        pcm_values = interface.read_pcm_values(_SIZED_DEFINITIONS)
+        connection.commands_sent = []
+        interface.read_pcm_values(_SIZED_DEFINITIONS)
+
+        eq_(_EXPECTED_PCM_VALUES, pcm_values)
+        eq_(["01 0C", "01 0D", "01 05", "01 2F"], connection.commands_sent)
+
+    def test_unsupported_values_are_not_requested_again(self):
+        connection = _ScriptedConnection({"01 2F": "?", "01 0C 0D 05": "?"})
+        interface = OBDInterface(connection)
+
+        interface.read_pcm_values(_SIZED_DEFINITIONS)
+        connection.commands_sent = []
+        pcm_values = interface.read_pcm_values(_SIZED_DEFINITIONS)
+
+        ok_(_SIZED_DEFINITIONS[3] not in pcm_values)
+        ok_("01 2F" not in connection.commands_sent)
+
+    def test_deadline(self):
+        device_emulator = DeviceEmulator(self._DATA_BY_PID)
+        interface = OBDInterface(device_emulator)
+
+        interface.read_pcm_values(_SIZED_DEFINITIONS, deadline=1234)
+
+        deadlines_by_command = dict(
+            zip(device_emulator.commands_sent, device_emulator.deadlines),
+            )
+        eq_(1234, deadlines_by_command["01 2F"])
+        eq_(1234, deadlines_by_command["01 0C 0D 05"])
+
+
+class TestInitialization(object):
+
+    def setup(self):
+        self.temporary_directory_path = mkdtemp()
+        self.protocol_cache = ProtocolCache(
+            os.path.join(self.temporary_directory_path, "protocols.json"),
+            )
+
+    def teardown(self):
+        shutil.rmtree(self.temporary_directory_path)
+
+    def test_full_reset(self):
+        connection = _ScriptedConnection({})
+        OBDInterface(connection)
+
+        eq_(["AT Z", "AT E0"], connection.at_commands_sent)
+
+    def test_warm_start(self):
+        connection = _ScriptedConnection({})
+        OBDInterface(connection, reset_command=ADAPTER_WARM_START_COMMAND)
+
+        eq_(["AT WS", "AT E0"], connection.at_commands_sent)
+
+    def test_no_reset(self):
+        connection = _ScriptedConnection({})
+        OBDInterface(connection, reset_command=None)
+
+        eq_(["AT E0"], connection.at_commands_sent)
+
+    def test_detected_protocol_is_cached(self):
+        connection = _ScriptedConnection({"01 10": "41 10 01", "AT DPN": "A6"})
+        interface = OBDInterface(connection, None, self.protocol_cache, "VIN1")
+
+        interface.read_pcm_value(_STUB_PCM_VALUE_DEFINITION)
+        interface.read_pcm_value(_STUB_PCM_VALUE_DEFINITION)
+
+        eq_(["AT E0", "AT DPN"], connection.at_commands_sent)
+        eq_("6", self.protocol_cache.get("VIN1"))
+
+    def test_cached_protocol_is_set(self):
+        self.protocol_cache.set("VIN1", "6")
+        protocol_cache = ProtocolCache(self.protocol_cache._file_path)
+        connection = _ScriptedConnection({"01 10": "41 10 01"})
+        interface = OBDInterface(connection, None, protocol_cache, "VIN1")
+
+        interface.read_pcm_value(_STUB_PCM_VALUE_DEFINITION)
+
+        eq_(["AT E0", "AT SP A6"], connection.at_commands_sent)
+
+    def test_protocol_is_not_cached_until_detected(self):
+        connection = _ScriptedConnection({"01 10": "41 10 01", "AT DPN": "A0"})
+        interface = OBDInterface(connection, None, self.protocol_cache, "VIN1")
+
+        interface.read_pcm_value(_STUB_PCM_VALUE_DEFINITION)
+
+        eq_(["AT E0", "AT DPN"], connection.at_commands_sent)
+        assert_is_none(self.protocol_cache.get("VIN1"))
+
+
+class TestDiagnostics(object):
+
+    def test_stored_trouble_codes(self):
+        connection = _ScriptedConnection({"03": "43 01 33 00 00 00 00"})
+        interface = OBDInterface(connection)
+
+        eq_(["P0133"], interface.read_stored_trouble_codes())
+
+    def test_trouble_codes_of_every_system(self):
+        connection = _ScriptedConnection({
+            "07": "47 04 01 33 41 00 82 00 C1 23",
+            })
+        interface = OBDInterface(connection)
+
+        eq_(
+            ["P0133", "C0100", "B0200", "U0123"],
+            interface.read_pending_trouble_codes(),
+            )
+
+    def test_multiframe_trouble_codes(self):
+        connection = _ScriptedConnection({
+            "0A": "00A\r0: 4A 04 01 33 01 34\r1: 01 35 01 36 00 00 00",
+            })
+        interface = OBDInterface(connection)
+
+        eq_(
+            ["P0133", "P0134", "P0135", "P0136"],
+            interface.read_permanent_trouble_codes(),
+            )
+
+    def test_trouble_codes_from_several_pcms(self):
+        connection = _ScriptedConnection({
+            "03": "SEARCHING...\r43 01 33 00 00 00 00\r43 11 34 01 33 00 00",
+            })
+        interface = OBDInterface(connection)
+
+        eq_(["P0133", "P1134"], interface.read_stored_trouble_codes())
+
+    def test_no_trouble_codes(self):
+        connection = _ScriptedConnection({"03": "NO DATA"})
+        interface = OBDInterface(connection)
+
+        eq_([], interface.read_stored_trouble_codes())
+
+    def test_supported_pids(self):
+        connection = _ScriptedConnection({
+            "01 00": "41 00 80 00 00 01",
+            "01 20": "41 20 00 00 00 02",
+            })
+        interface = OBDInterface(connection)
+
+        eq_(set([0x01, 0x20, 0x3F]), interface.read_supported_pids(0x01))
+
+        interface.read_supported_pids(0x01)
+        eq_(["01 00", "01 20"], connection.commands_sent)
+
+    def test_freeze_frame(self):
+        rpm = PCMValueDefinition(
+            OBDCommand(0x01, 0x0C),
+            NumericValueParser("rpm", value_scaler=lambda v: v / 4),
+            byte_count=2,
+            )
+        speed = PCMValueDefinition(
+            OBDCommand(0x01, 0x0D),
+            NumericValueParser("km/h"),
+            byte_count=1,
+            )
+        unsized = \
+            PCMValueDefinition(OBDCommand(0x01, 0x05), NumericValueParser())
+        unsupported = \
+            PCMValueDefinition(OBDCommand(0x01, 0x2F), NumericValueParser())
+        connection = _ScriptedConnection({
+            "02 00 00": "42 00 00 08 18 00 00",
+            "02 0C 00 0D 00":
+                "00A\r0: 42 0C 00 1A F8 0D\r1: 00 32 00 00 00 00 00",
+            "02 05 00": "42 05 00 7B",
+            })
+        interface = OBDInterface(connection)
+
+        pcm_values = interface.read_freeze_frame(
+            [rpm, speed, unsized, unsupported],
+            )
+
+        eq_(
+            {
+                rpm: PCMValue(1726, "rpm"),
+                speed: PCMValue(50, "km/h"),
+                unsized: PCMValue(123),
+                },
+            pcm_values,
+            )
+
+
+class TestDataIdentifiers(object):
+
+    _BATTERY_SOC = PCMValueDefinition(
+        DataIdentifierCommand(0x0101),
+        NumericValueParser("%"),
+        byte_count=1,
+        )
+
+    _TRANSMISSION_TEMPERATURE = PCMValueDefinition(
+        DataIdentifierCommand(0x0102),
+        NumericValueParser("C", value_scaler=lambda v: v - 40),
+        byte_count=2,
+        )
+
+    def test_command(self):
+        command = DataIdentifierCommand(0xF190)
+
+        eq_(("22", "F1", "90"), command.to_hex_words())
+        eq_(
+            "DataIdentifierCommand(mode=0x22, data_identifier=0xf190)",
+            repr(command),
+            )
+        eq_(DataIdentifierCommand(0xF190), command)
+        eq_(hash(DataIdentifierCommand(0xF190)), hash(command))
+        assert_false(DataIdentifierCommand(0xF191) == command)
+
+    def test_reading(self):
+        connection = _ScriptedConnection({"22 01 02": "62 01 02 00 7B"})
+        interface = OBDInterface(connection)
+
+        pcm_value = interface.read_pcm_value(self._TRANSMISSION_TEMPERATURE)
+
+        eq_(PCMValue(83, "C"), pcm_value)
+
+    def test_multi_frame_response(self):
+        definition = PCMValueDefinition(
+            DataIdentifierCommand(0xF190),
+            NumericValueParser(),
+            )
+        connection = _ScriptedConnection({
+            "22 F1 90": "009\r0: 62 F1 90 01 02 03\r1: 04 05 06",
+            })
+        interface = OBDInterface(connection)
+
+        pcm_value = interface.read_pcm_value(definition)
+
+        eq_(PCMValue(0x010203040506), pcm_value)
+
+    def test_negative_response(self):
+        connection = _ScriptedConnection({"22 01 01": "7F 22 31"})
+        interface = OBDInterface(connection)
+
+        with assert_raises(ValueNotAvailableError):
+            interface.read_pcm_value(self._BATTERY_SOC)
+
+    def test_response_pending(self):
+        connection = _ScriptedConnection({
+            "22 01 02": "7F 22 78\r62 01 02 00 7B",
+            })
+        interface = OBDInterface(connection)
+
+        pcm_value = interface.read_pcm_value(self._TRANSMISSION_TEMPERATURE)
+
+        eq_(PCMValue(83, "C"), pcm_value)
+
+    def test_transient_negative_response(self):
+        connection = _ScriptedConnection({"22 01 01": "7F 22 22"})
+        interface = OBDInterface(connection)
+
+        assert_is_none(interface.read_pcm_value(self._BATTERY_SOC))
+        assert_is_none(interface.read_pcm_value(self._BATTERY_SOC))
+        eq_(["22 01 01", "22 01 01"], connection.commands_sent)
+
+    def test_batched_reading(self):
+        connection = _ScriptedConnection({
+            "22 01 01 01 02": "62 01 01 55 01 02 00 7B",
+            })
+        interface = OBDInterface(connection)
+
+        pcm_values = interface.read_pcm_values(
+            [self._BATTERY_SOC, self._TRANSMISSION_TEMPERATURE],
+            max_data_identifiers_per_request=2,
+            )
+
+        eq_(
+            {
+                self._BATTERY_SOC: PCMValue(0x55, "%"),
+                self._TRANSMISSION_TEMPERATURE: PCMValue(83, "C"),
+                },
+            pcm_values,
+            )
+
+    def test_batched_reading_rejected(self):
+        connection = _ScriptedConnection({
+            "22 01 01 01 02": "7F 22 13",
+            "22 01 01": "62 01 01 55",
+            "22 01 02": "62 01 02 00 7B",
+            })
+        interface = OBDInterface(connection)
+
+        pcm_values = interface.read_pcm_values(
+            [self._BATTERY_SOC, self._TRANSMISSION_TEMPERATURE],
+            max_data_identifiers_per_request=2,
+            )
+
+        eq_(
+            {
+                self._BATTERY_SOC: PCMValue(0x55, "%"),
+                self._TRANSMISSION_TEMPERATURE: PCMValue(83, "C"),
+                },
+            pcm_values,
+            )
+
+    def test_batched_reading_with_transient_negative_response(self):
+        connection = _ScriptedConnection({"22 01 01 01 02": "7F 22 22"})
+        interface = OBDInterface(connection)
+        definitions = [self._BATTERY_SOC, self._TRANSMISSION_TEMPERATURE]
+
+        for _ in range(2):
+            pcm_values = interface.read_pcm_values(
+                definitions,
+                max_data_identifiers_per_request=2,
+                )
+            eq_(dict.fromkeys(definitions), pcm_values)
+
+        eq_(["22 01 01 01 02"] * 2, connection.commands_sent[1:])
+
+    def test_one_data_identifier_per_request_by_default(self):
+        connection = _ScriptedConnection({
+            "22 01 01": "62 01 01 55",
+            "22 01 02": "62 01 02 00 7B",
+            })
+        interface = OBDInterface(connection)
+
+        interface.read_pcm_values(
+            [self._BATTERY_SOC, self._TRANSMISSION_TEMPERATURE],
+            )
+
+        eq_(["22 01 01", "22 01 02"], connection.commands_sent)
+
+
 class _ConstantResponseConnection(object):
 
     def __init__(self, raw_response):
@@ -168,6 +701,23 @@ class _ConstantResponseConnection(object):
         eq_(expected_count, self._commands_sent_count)
 
 
+class _ScriptedConnection(object):
+
+    def __init__(self, responses_by_command):
+        self._responses_by_command = responses_by_command
+
+        self.commands_sent = []
+        self.at_commands_sent = []
+
+    def send_command(self, command, read_delay=None):
+        if command.startswith("AT"):
+            self.at_commands_sent.append(command)
+            return self._responses_by_command.get(command, "OK")
+
+        self.commands_sent.append(command)
+        return self._responses_by_command.get(command, "NO DATA")
+
+
 class _NoValueSupportedConnection(object):
 
     def send_command(self, command, read_delay=None):
@@ -177,4 +727,8 @@ class _NoValueSupportedConnection(object):
         return ""
 
 def _make_response_for_command(command, response_data):
-    return "{} {} {}".format(command.mode, command.pid, response_data)
+    return "{:02X} {:02X} {}".format(
+        command.mode + 0x40,
+        command.pid,
+        response_data,
+        )
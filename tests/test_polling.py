@@ -0,0 +1,177 @@
+################################################################################
+# The MIT License (MIT)
+#
+# Copyright (c) 2014 Francisco Ruiz
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+################################################################################
+
+import time
+
+from nose.tools import assert_false
+from nose.tools import assert_is_none
+from nose.tools import eq_
+from nose.tools import ok_
+
+from elm327.connection import RequestTimeoutError
+from elm327.obd import OBDCommand
+from elm327.obd import ValueNotAvailableError
+from elm327.pcm_values import NumericValueParser
+from elm327.pcm_values import PCMValue
+from elm327.pcm_values import PCMValueDefinition
+from elm327.polling import LatencyTracker
+from elm327.polling import Poller
+
+
+_SPEED = PCMValueDefinition(OBDCommand(0x01, 0x0D), NumericValueParser())
+
+_RPM = PCMValueDefinition(OBDCommand(0x01, 0x0C), NumericValueParser())
+
+_FUEL_LEVEL = PCMValueDefinition(OBDCommand(0x01, 0x2F), NumericValueParser())
+
+
+class TestLatencyTracker(object):
+
+    def test_percentiles(self):
+        tracker = LatencyTracker()
+        for latency in range(1, 101):
+            tracker.add("a", latency / 1000.0)
+        tracker.add("b", 1)
+
+        eq_(0.05, tracker.get_percentile(50, "a"))
+        eq_(0.099, tracker.get_percentile(99, "a"))
+        eq_(1, tracker.get_percentile(100))
+        assert_is_none(tracker.get_percentile(99, "c"))
+
+    def test_window(self):
+        tracker = LatencyTracker(window_size=2)
+        for latency in (3, 1, 2):
+            tracker.add("a", latency)
+
+        eq_(2, tracker.get_percentile(100, "a"))
+
+
+class TestPoller(object):
+
+    def test_polling(self):
+        interface = _FakeInterface({_SPEED: PCMValue(50), _RPM: PCMValue(800)})
+        poller = Poller(interface, [_SPEED, _RPM], cycle_duration=60)
+
+        pcm_values = poller.poll()
+
+        eq_({_SPEED: PCMValue(50), _RPM: PCMValue(800)}, pcm_values)
+        eq_([], poller.skipped_definitions)
+        ok_(poller.get_latency_percentile(99) < 1)
+        for deadline in interface.deadlines:
+            ok_(deadline - time.time() <= 60)
+
+    def test_slow_values_are_skipped_and_then_prioritized(self):
+        interface = _FakeInterface({_SPEED: PCMValue(50), _RPM: PCMValue(800)})
+        poller = Poller(interface, [_SPEED, _RPM], cycle_duration=1)
+        poller.latency_tracker.add(_SPEED, 10)
+
+        pcm_values = poller.poll()
+        eq_({_RPM: PCMValue(800)}, pcm_values)
+        eq_([_SPEED], poller.skipped_definitions)
+
+        pcm_values = poller.poll()
+        eq_({_SPEED: PCMValue(50), _RPM: PCMValue(800)}, pcm_values)
+        eq_([_SPEED, _RPM], interface.definitions_read[-2:])
+
+    def test_timed_out_requests(self):
+        interface = _FakeInterface({_SPEED: RequestTimeoutError()})
+        poller = Poller(interface, [_SPEED], cycle_duration=0.01)
+
+        eq_({}, poller.poll())
+        assert_false(poller.skipped_definitions)
+
+    def test_values_timing_out_are_demoted(self):
+        interface = _FakeInterface({
+            _RPM: RequestTimeoutError(),
+            _SPEED: PCMValue(50),
+            _FUEL_LEVEL: PCMValue(20),
+            })
+        poller = Poller(
+            interface,
+            [_RPM, _SPEED, _FUEL_LEVEL],
+            cycle_duration=0.05,
+            timed_out_retry_period=3,
+            )
+
+        pcm_values_by_cycle = [poller.poll() for _ in range(6)]
+
+        eq_({}, pcm_values_by_cycle[0])
+        for pcm_values in pcm_values_by_cycle[1:]:
+            eq_({_SPEED: PCMValue(50), _FUEL_LEVEL: PCMValue(20)}, pcm_values)
+        eq_(
+            [_RPM, _SPEED, _FUEL_LEVEL, _SPEED, _FUEL_LEVEL, _SPEED,
+             _FUEL_LEVEL, _RPM],
+            interface.definitions_read[:8],
+            )
+        eq_(2, interface.definitions_read.count(_RPM))
+        for read_time, deadline in \
+                zip(interface.read_times, interface.deadlines):
+            ok_(read_time < deadline)
+
+    def test_demoted_values_are_promoted_once_answered(self):
+        interface = _FakeInterface({_SPEED: RequestTimeoutError()})
+        poller = Poller(
+            interface,
+            [_SPEED],
+            cycle_duration=0.01,
+            latency_window_size=1,
+            timed_out_retry_period=2,
+            )
+        eq_({}, poller.poll())
+        eq_({}, poller.poll())
+        interface.results_by_definition[_SPEED] = PCMValue(50)
+
+        eq_({_SPEED: PCMValue(50)}, poller.poll())
+        eq_({_SPEED: PCMValue(50)}, poller.poll())
+        eq_(3, len(interface.definitions_read))
+
+    def test_unavailable_values(self):
+        interface = _FakeInterface({_FUEL_LEVEL: ValueNotAvailableError()})
+        poller = Poller(interface, [_FUEL_LEVEL], cycle_duration=1)
+
+        eq_({}, poller.poll())
+        assert_false(poller.skipped_definitions)
+
+
+class _FakeInterface(object):
+    """Interface whose requests that time out hang until their deadline"""
+
+    def __init__(self, results_by_definition):
+        self.results_by_definition = results_by_definition
+
+        self.definitions_read = []
+        self.deadlines = []
+        self.read_times = []
+
+    def read_pcm_value(self, definition, read_delay=None, deadline=None):
+        self.definitions_read.append(definition)
+        self.deadlines.append(deadline)
+        self.read_times.append(time.time())
+
+        result = self.results_by_definition[definition]
+        if isinstance(result, RequestTimeoutError):
+            time.sleep(max(deadline - time.time(), 0))
+        if isinstance(result, Exception):
+            raise result
+        return result
@@ -0,0 +1,218 @@
+################################################################################
+# The MIT License (MIT)
+#
+# Copyright (c) 2014 Francisco Ruiz
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+################################################################################
+
+from nose.tools import assert_false
+from nose.tools import eq_
+from nose.tools import ok_
+
+from elm327.obd import OBDCommand
+from elm327.obd import ValueNotAvailableError
+from elm327.pcm_values import ENGINE_RPM
+from elm327.pcm_values import FUEL_TYPE
+from elm327.pcm_values import NumericValueParser
+from elm327.pcm_values import PCMValue
+from elm327.pcm_values import PCMValueDefinition
+from elm327.pcm_values import VEHICLE_SPEED
+from elm327.sampling import AdaptiveSampler
+from elm327.sampling import SamplingBounds
+
+
+_COOLANT_TEMPERATURE = \
+    PCMValueDefinition(OBDCommand(0x01, 0x05), NumericValueParser())
+
+_FUEL_LEVEL = PCMValueDefinition(OBDCommand(0x01, 0x2F), NumericValueParser())
+
+
+class TestAdaptiveSampler(object):
+
+    def test_first_poll_reads_all_channels(self):
+        interface = _FakeInterface({_COOLANT_TEMPERATURE: 80, _FUEL_LEVEL: 50})
+        sampler = AdaptiveSampler(
+            interface,
+            {
+                _COOLANT_TEMPERATURE: SamplingBounds(1, 30, 1),
+                _FUEL_LEVEL: SamplingBounds(1, 60, 1),
+                },
+            )
+
+        pcm_values = sampler.poll(now=0)
+
+        eq_(
+            {_COOLANT_TEMPERATURE: PCMValue(80), _FUEL_LEVEL: PCMValue(50)},
+            pcm_values,
+            )
+
+    def test_flat_channels_back_off(self):
+        interface = _FakeInterface({_COOLANT_TEMPERATURE: 80})
+        sampler = AdaptiveSampler(
+            interface,
+            {_COOLANT_TEMPERATURE: SamplingBounds(1, 30, 1)},
+            )
+        sampler.poll(now=0)
+        sampler.poll(now=1)
+
+        eq_(30, sampler.get_interval(_COOLANT_TEMPERATURE))
+        eq_({}, sampler.poll(now=20))
+        ok_(_COOLANT_TEMPERATURE in sampler.poll(now=31))
+
+    def test_changing_channels_speed_up(self):
+        interface = _FakeInterface({_COOLANT_TEMPERATURE: 80})
+        sampler = AdaptiveSampler(
+            interface,
+            {_COOLANT_TEMPERATURE: SamplingBounds(1, 30, 5)},
+            rate_smoothing=1,
+            )
+        sampler.poll(now=0)
+        interface.values_by_definition[_COOLANT_TEMPERATURE] = 81
+        sampler.poll(now=1)
+
+        eq_(5, sampler.get_interval(_COOLANT_TEMPERATURE))
+
+        interface.values_by_definition[_COOLANT_TEMPERATURE] = 131
+        sampler.poll(now=6)
+
+        eq_(1, sampler.get_interval(_COOLANT_TEMPERATURE))
+
+    def test_flat_non_numeric_channels_back_off(self):
+        interface = _FakeInterface({FUEL_TYPE: "Gasoline"})
+        sampler = AdaptiveSampler(
+            interface,
+            {FUEL_TYPE: SamplingBounds(1, 60, 1)},
+            )
+        sampler.poll(now=0)
+        interface.values_by_definition[FUEL_TYPE] = "Diesel"
+        sampler.poll(now=1)
+
+        eq_(1, sampler.get_interval(FUEL_TYPE))
+
+        now = 1
+        for _ in range(20):
+            now += sampler.get_interval(FUEL_TYPE)
+            ok_(FUEL_TYPE in sampler.poll(now))
+
+        eq_(60, sampler.get_interval(FUEL_TYPE))
+
+    def test_engine_off_backoff(self):
+        interface = _FakeInterface({
+            ENGINE_RPM: 0,
+            VEHICLE_SPEED: 0,
+            _COOLANT_TEMPERATURE: 80,
+            })
+        sampler = AdaptiveSampler(
+            interface,
+            {
+                ENGINE_RPM: SamplingBounds(0.1, 1, 100),
+                VEHICLE_SPEED: SamplingBounds(0.1, 1, 1),
+                _COOLANT_TEMPERATURE: SamplingBounds(1, 30, 1),
+                },
+            engine_off_backoff=10,
+            )
+        sampler.poll(now=0)
+        sampler.poll(now=1)
+
+        ok_(sampler.is_engine_off)
+        eq_(10, sampler.get_interval(_COOLANT_TEMPERATURE))
+        eq_(1, sampler.get_interval(ENGINE_RPM))
+        eq_(1, sampler.get_interval(VEHICLE_SPEED))
+
+    def test_engine_start_is_noticed_promptly(self):
+        interface = _FakeInterface({ENGINE_RPM: 0, VEHICLE_SPEED: 0})
+        sampler = AdaptiveSampler(
+            interface,
+            {
+                ENGINE_RPM: SamplingBounds(0.1, 1, 100),
+                VEHICLE_SPEED: SamplingBounds(0.1, 1, 1),
+                },
+            engine_off_backoff=10,
+            )
+        sampler.poll(now=0)
+        sampler.poll(now=1)
+        ok_(sampler.is_engine_off)
+
+        interface.values_by_definition[ENGINE_RPM] = 800
+        pcm_values = sampler.poll(now=2)
+
+        eq_(PCMValue(800), pcm_values[ENGINE_RPM])
+        assert_false(sampler.is_engine_off)
+
+    def test_changing_channels_are_read_first(self):
+        interface = _FakeInterface({_COOLANT_TEMPERATURE: 80, _FUEL_LEVEL: 50})
+        sampler = AdaptiveSampler(
+            interface,
+            {
+                _COOLANT_TEMPERATURE: SamplingBounds(1, 10, 1),
+                _FUEL_LEVEL: SamplingBounds(1, 10, 1),
+                },
+            rate_smoothing=1,
+            )
+        sampler.poll(now=0)
+        interface.values_by_definition[_COOLANT_TEMPERATURE] = 90
+        sampler.poll(now=1)
+        interface.definitions_read = []
+
+        sampler.poll(now=12)
+
+        eq_([_COOLANT_TEMPERATURE, _FUEL_LEVEL], interface.definitions_read)
+
+    def test_request_budget(self):
+        interface = _FakeInterface({_COOLANT_TEMPERATURE: 80, _FUEL_LEVEL: 50})
+        sampler = AdaptiveSampler(
+            interface,
+            {
+                _COOLANT_TEMPERATURE: SamplingBounds(1, 10, 1),
+                _FUEL_LEVEL: SamplingBounds(1, 10, 1),
+                },
+            max_requests_per_second=1,
+            )
+
+        eq_(1, len(sampler.poll(now=0)))
+        eq_(0, len(sampler.poll(now=0.5)))
+        eq_(1, len(sampler.poll(now=1)))
+
+    def test_unavailable_values(self):
+        interface = _FakeInterface({_FUEL_LEVEL: ValueNotAvailableError()})
+        sampler = AdaptiveSampler(
+            interface,
+            {_FUEL_LEVEL: SamplingBounds(1, 10, 1)},
+            )
+
+        eq_({}, sampler.poll(now=0))
+        eq_({}, sampler.poll(now=20))
+        eq_([_FUEL_LEVEL], interface.definitions_read)
+
+
+class _FakeInterface(object):
+
+    def __init__(self, values_by_definition):
+        self.values_by_definition = values_by_definition
+
+        self.definitions_read = []
+
+    def read_pcm_value(self, definition, read_delay=None, deadline=None):
+        self.definitions_read.append(definition)
+
+        value = self.values_by_definition[definition]
+        if isinstance(value, Exception):
+            raise value
+        return PCMValue(value)
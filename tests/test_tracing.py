@@ -0,0 +1,170 @@
+################################################################################
+# The MIT License (MIT)
+#
+# Copyright (c) 2014 Francisco Ruiz
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+################################################################################
+
+from StringIO import StringIO
+import json
+
+from nose.tools import assert_almost_equal
+from nose.tools import assert_in
+from nose.tools import eq_
+
+from elm327.connection import SerialConnection
+from elm327.obd import OBDCommand
+from elm327.obd import OBDInterface
+from elm327.pcm_values import NumericValueParser
+from elm327.pcm_values import PCMValueDefinition
+from elm327.tracing import Tracer
+
+from tests.utils import DeviceEmulator
+from tests.utils import MockSerialPort
+from tests.utils import MockSerialPortDataReader
+
+
+class TestTracer(object):
+
+    def test_chrome_trace_export(self):
+        tracer = Tracer()
+        tracer.add_span("write", 1.5, 1.75, bytes=7)
+        tracer.add_instant_event("prompt", 2)
+
+        trace_events = _export_trace_events(tracer)
+
+        eq_(2, len(trace_events))
+        span_event, instant_event = trace_events
+        eq_("write", span_event["name"])
+        eq_("X", span_event["ph"])
+        eq_(1500000, span_event["ts"])
+        eq_(250000, span_event["dur"])
+        eq_({"bytes": 7}, span_event["args"])
+        eq_("prompt", instant_event["name"])
+        eq_("i", instant_event["ph"])
+        eq_(2000000, instant_event["ts"])
+
+    def test_capacity(self):
+        tracer = Tracer(capacity=2)
+        for event_index in range(3):
+            tracer.add_instant_event(str(event_index), event_index)
+
+        trace_events = _export_trace_events(tracer)
+
+        eq_(["1", "2"], [event["name"] for event in trace_events])
+
+    def test_span_context_manager(self):
+        tracer = Tracer()
+        with tracer.span("decode", bytes=2) as span_args:
+            span_args["result"] = "a value"
+
+        span_event = _export_trace_events(tracer)[0]
+        eq_({"bytes": 2, "result": "a value"}, span_event["args"])
+
+    def test_span_context_manager_with_error(self):
+        tracer = Tracer()
+        try:
+            with tracer.span("decode"):
+                raise ValueError("a message")
+        except ValueError:
+            pass
+
+        span_event = _export_trace_events(tracer)[0]
+        assert_in("a message", span_event["args"]["error"])
+
+
+class TestTracedCommunication(object):
+
+    def test_traced_serial_connection(self):
+        tracer = Tracer()
+        port = MockSerialPort(reader=MockSerialPortDataReader("41 0C 1A F8>"))
+        connection = SerialConnection(port, tracer=tracer)
+
+        connection.send_command("01 0C")
+
+        trace_events = _export_trace_events(tracer)
+        eq_(
+            ["write", "adapter wait", "byte arrival", "prompt", "send command"],
+            [event["name"] for event in trace_events],
+            )
+        command_event = trace_events[-1]
+        eq_(
+            {"command": "01 0C", "response": "41 0C 1A F8"},
+            command_event["args"],
+            )
+        write_event = trace_events[0]
+        assert_almost_equal(write_event["ts"], command_event["ts"], delta=1000)
+
+    def test_traced_obd_interface(self):
+        tracer = Tracer()
+        definition = PCMValueDefinition(
+            OBDCommand(0x01, 0x0D),
+            NumericValueParser("km/h"),
+            )
+        interface = OBDInterface(_SpeedConnection(), tracer=tracer)
+
+        interface.read_pcm_value(definition)
+
+        decode_event, read_event = _export_trace_events(tracer)
+        eq_("decode", decode_event["name"])
+        eq_("read PCM value", read_event["name"])
+        eq_(
+            {
+                "command": "OBDCommand(mode=0x01, pid=0x0d)",
+                "result": "PCMValue(value=50, unit=km/h)",
+                },
+            read_event["args"],
+            )
+
+    def test_traced_batch_reading(self):
+        tracer = Tracer()
+        definitions = [
+            PCMValueDefinition(
+                OBDCommand(0x01, pid),
+                NumericValueParser(),
+                byte_count=1,
+                )
+            for pid in (0x0D, 0x05)
+            ]
+        device_emulator = DeviceEmulator({0x0D: [0x32], 0x05: [0x7B]})
+        interface = OBDInterface(device_emulator, tracer=tracer)
+
+        interface.read_pcm_values(definitions)
+
+        read_event = _export_trace_events(tracer)[-1]
+        eq_("read PCM values", read_event["name"])
+        eq_(
+            "[OBDCommand(mode=0x01, pid=0x0d), "
+            "OBDCommand(mode=0x01, pid=0x05)]",
+            read_event["args"]["commands"],
+            )
+
+
+class _SpeedConnection(object):
+
+    def send_command(self, data, read_delay=None):
+        return "41 0D 32"
+
+
+def _export_trace_events(tracer):
+    trace_file = StringIO()
+    tracer.export_chrome_trace(trace_file)
+    trace = json.loads(trace_file.getvalue())
+    return trace["traceEvents"]
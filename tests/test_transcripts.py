@@ -0,0 +1,193 @@
+################################################################################
+# The MIT License (MIT)
+#
+# Copyright (c) 2014 Francisco Ruiz
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+################################################################################
+
+from math import isnan
+from tempfile import mkdtemp
+import csv
+import os
+import shutil
+
+from nose.tools import eq_
+from nose.tools import ok_
+
+from elm327.obd import DataIdentifierCommand
+from elm327.pcm_values import NumericValueParser
+from elm327.pcm_values import PCMValueDefinition
+from elm327.transcripts import _iter_transcript_chunks
+from elm327.transcripts import decode_transcript
+from elm327.transcripts import decode_transcript_files
+from elm327.transcripts import read_columnar_file
+
+
+_TRANSCRIPT = (
+    "AT E1\rOK\r\r>"
+    "01 0C\r41 0C 1A F8\r\r>"
+    "01 0D\r41 0D 32\r\r>"
+    "01 51\r41 51 01\r\r>"
+    "01 2F\rNO DATA\r\r>"
+    "01 99\r41 99 01\r\r>"
+    "01 0D\r?\r\r>"
+    )
+
+
+class TestTranscriptDecoding(object):
+
+    def test_decoding(self):
+        rows = decode_transcript(_TRANSCRIPT)
+
+        eq_(
+            [
+                ("ENGINE_RPM", 1726, "rpm"),
+                ("VEHICLE_SPEED", 50, "km/h"),
+                ("FUEL_TYPE", "Gasoline", None),
+                ],
+            rows,
+            )
+
+    def test_decoding_batched_requests(self):
+        rows = decode_transcript(
+            "01 0C 0D\r41 0C 1A F8 0D 32\r\r>"
+            "STPX D:010D0C, R:1\r41 0D 33 0C 1A FC\r\r>"
+            "010D\r41 0D 34\r\r>"
+            )
+
+        eq_(
+            [
+                ("ENGINE_RPM", 1726, "rpm"),
+                ("VEHICLE_SPEED", 50, "km/h"),
+                ("VEHICLE_SPEED", 51, "km/h"),
+                ("ENGINE_RPM", 1727, "rpm"),
+                ("VEHICLE_SPEED", 52, "km/h"),
+                ],
+            rows,
+            )
+
+    def test_decoding_data_identifiers(self):
+        definitions_by_name = {
+            "BATTERY_SOC": PCMValueDefinition(
+                DataIdentifierCommand(0x0101),
+                NumericValueParser("%"),
+                byte_count=1,
+                ),
+            "BATTERY_VOLTAGE": PCMValueDefinition(
+                DataIdentifierCommand(0x0102),
+                NumericValueParser("V", value_scaler=lambda v: v / 10.0),
+                byte_count=2,
+                ),
+            }
+
+        rows = decode_transcript(
+            "22 01 01\r62 01 01 50\r\r>"
+            "22 01 02 01 01\r62 01 02 00 7B 01 01 51\r\r>",
+            definitions_by_name,
+            )
+
+        eq_(
+            [
+                ("BATTERY_SOC", 80, "%"),
+                ("BATTERY_VOLTAGE", 12.3, "V"),
+                ("BATTERY_SOC", 81, "%"),
+                ],
+            rows,
+            )
+
+    def test_chunks_end_with_prompt(self):
+        transcript_file = _StringFile(_TRANSCRIPT)
+
+        chunks = list(_iter_transcript_chunks(transcript_file, 16))
+
+        eq_(_TRANSCRIPT, "".join(chunks))
+        for chunk in chunks:
+            ok_(chunk.endswith(">"))
+
+
+class TestTranscriptFilesDecoding(object):
+
+    def setup(self):
+        self.temporary_directory_path = mkdtemp()
+        self.transcript_paths = []
+        for transcript_index in range(2):
+            transcript_path = os.path.join(
+                self.temporary_directory_path,
+                "transcript{}.txt".format(transcript_index),
+                )
+            with open(transcript_path, "wb") as transcript_file:
+                transcript_file.write(_TRANSCRIPT * 10)
+            self.transcript_paths.append(transcript_path)
+
+        self.csv_path = os.path.join(self.temporary_directory_path, "out.csv")
+        self.columnar_path = \
+            os.path.join(self.temporary_directory_path, "out.elmc")
+
+    def teardown(self):
+        shutil.rmtree(self.temporary_directory_path)
+
+    def test_decoding_in_parallel(self):
+        statistics = decode_transcript_files(
+            self.transcript_paths,
+            self.csv_path,
+            self.columnar_path,
+            processes=2,
+            chunk_size=64,
+            )
+
+        eq_(60, statistics.row_count)
+        eq_(40, statistics.skipped_line_count)
+        eq_(len(_TRANSCRIPT) * 20, statistics.byte_count)
+
+        with open(self.csv_path, "rb") as csv_file:
+            csv_rows = list(csv.reader(csv_file))
+        eq_(["index", "name", "value", "unit"], csv_rows[0])
+        eq_(["0", "ENGINE_RPM", "1726", "rpm"], csv_rows[1])
+        eq_(["59", "FUEL_TYPE", "Gasoline", ""], csv_rows[-1])
+
+        with open(self.columnar_path, "rb") as columnar_file:
+            columns = read_columnar_file(columnar_file)
+        eq_(range(60), columns["index"])
+        eq_(["ENGINE_RPM", "VEHICLE_SPEED", "FUEL_TYPE"], columns["name"][:3])
+        eq_([1726, 50], columns["value"][:2])
+        ok_(isnan(columns["value"][2]))
+        eq_(["", "", "Gasoline"], columns["text"][:3])
+        eq_(["rpm", "km/h", ""], columns["unit"][:3])
+
+    def test_decoding_in_process(self):
+        statistics = decode_transcript_files(
+            self.transcript_paths,
+            self.csv_path,
+            processes=1,
+            )
+
+        eq_(60, statistics.row_count)
+
+
+class _StringFile(object):
+
+    def __init__(self, data):
+        self._data = data
+        self._position = 0
+
+    def read(self, size):
+        chunk = self._data[self._position:self._position + size]
+        self._position += size
+        return chunk
@@ -23,6 +23,8 @@ class MockSerialPort(object):
     def __init__(self, writer=None, reader=None):
         self._method_calls = []
 
+        self.timeout = None
+
         self._data_writer = writer or MockSerialPortDataWriter()
 
         self._data_reader = reader or MockSerialPortDataReader()
@@ -119,6 +121,10 @@ class MockSerialPort(object):
     def read(self, size=1):
         return self._data_reader.read(size)
 
+    @_mock_method
+    def inWaiting(self):
+        return self._data_reader.count_unread_characters()
+
     @_mock_method
     def write(self, data):
         self._data_writer.write(data)
@@ -156,11 +162,87 @@ class MockSerialPortDataReader(object):
     def read(self, size):
         chunk = "".join(islice(self._expected_data, size))
         self.data_read += chunk
+        self._unread_characters_count -= len(chunk)
         return chunk
 
+    def count_unread_characters(self):
+        return self._unread_characters_count
+
     def _set_expected_data(self, data):
         if ">" not in data:
             data += ">"
         self._expected_data = iter(data)
+        self._unread_characters_count = len(data)
 
         self.data_read = ""
+
+
+class DeviceEmulator(object):
+    """
+    Connection that answers like an ELM327 device connected to a CAN PCM.
+
+    The PCM supports the PIDs in "data_by_pid", for any mode. Devices with
+    STN firmware also accept "STPX" requests.
+
+    """
+
+    def __init__(self, data_by_pid, is_stn_device=False):
+        self._data_by_pid = data_by_pid
+        self._is_stn_device = is_stn_device
+
+        self.commands_sent = []
+        self.deadlines = []
+
+    def send_command(self, command, read_delay=None, deadline=None):
+        self.commands_sent.append(command)
+        self.deadlines.append(deadline)
+
+        if command == "AT I":
+            return "ELM327 v1.4b"
+        if command.startswith("AT"):
+            return "OK"
+        if command == "STI":
+            return "STN1110 v4.2.1" if self._is_stn_device else "?"
+
+        if command.startswith("STPX"):
+            if not self._is_stn_device:
+                return "?"
+            request_words = self._parse_stpx_request(command)
+        else:
+            request_words = [int(word, 16) for word in command.split()]
+
+        mode = request_words[0]
+        response_words = [mode + 0x40]
+        for pid in request_words[1:]:
+            if pid in self._data_by_pid:
+                response_words.append(pid)
+                response_words.extend(self._data_by_pid[pid])
+
+        if len(response_words) == 1:
+            return "NO DATA"
+        return _format_can_response(response_words)
+
+    @staticmethod
+    def _parse_stpx_request(command):
+        for parameter in command[len("STPX"):].split(","):
+            name, _, value = parameter.strip().partition(":")
+            if name.upper() == "D":
+                return [
+                    int(value[index:index + 2], 16)
+                    for index in range(0, len(value), 2)
+                    ]
+        raise ValueError("No data in {!r}".format(command))
+
+
+def _format_can_response(words):
+    hex_words = ["{:02X}".format(word) for word in words]
+    if len(hex_words) <= 7:
+        return " ".join(hex_words)
+
+    lines = ["{:03X}".format(len(hex_words))]
+    frames = [hex_words[:6]]
+    for index in range(6, len(hex_words), 7):
+        frames.append(hex_words[index:index + 7])
+    for frame_index, frame in enumerate(frames):
+        lines.append("{}: {}".format(frame_index, " ".join(frame)))
+    return "\r".join(lines)